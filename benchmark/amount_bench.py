@@ -0,0 +1,65 @@
+"""
+Микробенчмарк models.Amount против прежней реализации на Decimal и float.
+
+Запуск из корня проекта:
+    python -m benchmark.amount_bench
+"""
+from __future__ import annotations
+
+import timeit
+from decimal import Decimal
+
+from models import Amount
+
+
+class LegacyAmount:
+    """
+    Прежняя реализация Amount, для сравнения
+    """
+
+    def __init__(self, amount, decimals: int = 18, wei: bool = False) -> None:
+        if wei:
+            self.wei = int(amount)
+            self.ether = Decimal(str(amount)) / 10 ** decimals
+            self.ether_float = float(self.ether)
+        else:
+            self.wei = int(amount * 10 ** decimals)
+            self.ether = Decimal(str(amount))
+            self.ether_float = float(amount)
+        self.decimals = decimals
+
+
+CASES = {
+    'создание из wei': (
+        lambda: LegacyAmount(123456789012345678901, wei=True),
+        lambda: Amount(123456789012345678901, wei=True),
+    ),
+    'создание из ether': (
+        lambda: LegacyAmount(0.123456),
+        lambda: Amount(0.123456),
+    ),
+    'минимум 98% для пула': (
+        lambda: LegacyAmount(int(LegacyAmount(10 ** 20, wei=True).wei * 0.98), wei=True),
+        lambda: Amount(10 ** 20, wei=True).mul_div(98, 100),
+    ),
+    'сравнение балансов': (
+        lambda: LegacyAmount(10 ** 18, wei=True).ether_float < LegacyAmount(0.5).ether_float,
+        lambda: Amount(10 ** 18, wei=True) < Amount(0.5),
+    ),
+}
+
+
+def main(number: int = 100_000) -> None:
+    for name, (legacy, current) in CASES.items():
+        legacy_time = timeit.timeit(legacy, number=number)
+        current_time = timeit.timeit(current, number=number)
+        print(f'{name:<24} было {legacy_time / number * 1e6:6.2f} мкс, '
+              f'стало {current_time / number * 1e6:6.2f} мкс, x{legacy_time / current_time:.1f}')
+
+    # точность: прежний путь через float терял младшие разряды wei
+    balance = Amount(123456789012345678901, wei=True)
+    print('98% от', balance.wei, 'было', int(balance.wei * 0.98), 'стало', balance.mul_div(98, 100).wei)
+
+
+if __name__ == '__main__':
+    main()
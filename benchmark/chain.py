@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import time
+
+from eth_account import Account as EthAccount
+from web3 import Web3, HTTPProvider
+
+BENCHMARK_PATH = os.path.dirname(os.path.abspath(__file__))
+ANVIL_PRIVATE_KEY = '0xac0974bec39a17e36ba4a6b4d238ff944bacb478cbed5efcae784d7bf4f2ff80'
+SWAP_ROUTER = Web3.to_checksum_address('0x000000000000000000000000000000000000b0b0')
+WETH = Web3.to_checksum_address('0x000000000000000000000000000000000000e7e7')
+
+# резервы пулов: 1 ETH = 25000 ZERO и 1 ETH = 5000 NILE
+RESERVES = {
+    'ZERO': (250_000 * 10 ** 18, 10 * 10 ** 18),
+    'NILE': (50_000 * 10 ** 18, 10 * 10 ** 18),
+}
+
+
+class Chain:
+    """
+    Локальная нода anvil с моками контрактов Nile, Zerolend и свапа Wowmax на боевых адресах
+    """
+
+    def __init__(self, port: int) -> None:
+        self.port = port
+        self.rpc = f'http://127.0.0.1:{port}'
+        self.process: subprocess.Popen | None = None
+        self.w3: Web3 | None = None
+        self.deployer = EthAccount.from_key(ANVIL_PRIVATE_KEY)
+
+    def start(self) -> None:
+        """
+        Запускает anvil с chain id Linea и базовой комиссией 7 wei, как в сети
+        :return: None
+        """
+        self.process = subprocess.Popen(
+            ['anvil', '--port', str(self.port), '--chain-id', '59144',
+             '--block-base-fee-per-gas', '7', '--silent'],
+        )
+        self.w3 = Web3(HTTPProvider(self.rpc))
+        for _ in range(50):
+            if self.w3.is_connected():
+                return
+            time.sleep(0.2)
+        raise Exception('anvil не запустился')
+
+    def stop(self) -> None:
+        """
+        Останавливает anvil
+        :return: None
+        """
+        if self.process:
+            self.process.terminate()
+            self.process.wait()
+
+    @staticmethod
+    def compile() -> dict[str, dict]:
+        """
+        Компилирует моки через forge и возвращает артефакты по имени контракта
+        :return: словарь имя контракта - артефакт с abi и runtime байткодом
+        """
+        subprocess.run(['forge', 'build', '--root', BENCHMARK_PATH], check=True, capture_output=True)
+        artifacts = {}
+        for name in ('MockToken', 'MockRouter', 'MockSwapRouter', 'MockLocker', 'MockZerolend'):
+            with open(os.path.join(BENCHMARK_PATH, 'out', 'Mocks.sol', f'{name}.json')) as f:
+                artifacts[name] = json.load(f)
+        return artifacts
+
+    def setup(self) -> None:
+        """
+        Ставит моки на адреса из core.onchain и заполняет их состояние
+        :return: None
+        """
+        from core.onchain import Contracts, Tokens
+
+        artifacts = self.compile()
+        code = {
+            Tokens.ZERO.address: 'MockToken',
+            Tokens.NILE.address: 'MockToken',
+            Tokens.LP_ZERO_WETH.address: 'MockToken',
+            Tokens.LP_NILE_WETH.address: 'MockToken',
+            Tokens.ZERO_ETH.address: 'MockToken',
+            Tokens.ZERO_LP_VOTING.address: 'MockToken',
+            Contracts.nile_router.address: 'MockRouter',
+            Contracts.nile_locker_lp.address: 'MockLocker',
+            Contracts.zerolend.address: 'MockZerolend',
+            SWAP_ROUTER: 'MockSwapRouter',
+        }
+        for address, name in code.items():
+            self.w3.provider.make_request(
+                'anvil_setCode', [address, artifacts[name]['deployedBytecode']['object']])
+
+        def contract(address: str, name: str):
+            return self.w3.eth.contract(address=address, abi=artifacts[name]['abi'])
+
+        router = contract(Contracts.nile_router.address, 'MockRouter')
+        swap_router = contract(SWAP_ROUTER, 'MockSwapRouter')
+        for symbol, (reserve_token, reserve_eth) in RESERVES.items():
+            token = getattr(Tokens, symbol)
+            lp_token = Tokens.get_lp_token(token)
+            pair = contract(lp_token.address, 'MockToken')
+            self.transact(contract(token.address, 'MockToken').functions.mint(lp_token.address, reserve_token))
+            self.transact(pair.functions.mint(self.deployer.address, reserve_eth))
+            self.transact(pair.functions.setReserves(reserve_token, reserve_eth))
+            self.transact(router.functions.init(WETH, token.address, lp_token.address))
+            self.transact(swap_router.functions.init(token.address, lp_token.address))
+
+        self.transact(contract(Contracts.nile_locker_lp.address, 'MockLocker').functions.init(
+            Tokens.LP_ZERO_WETH.address, Tokens.ZERO_LP_VOTING.address))
+        self.transact(contract(Contracts.zerolend.address, 'MockZerolend').functions.init(Tokens.ZERO_ETH.address))
+
+        for address in (Contracts.nile_router.address, SWAP_ROUTER):
+            self.set_balance(address, 10_000 * 10 ** 18)
+
+    def transact(self, function) -> None:
+        """
+        Отправляет транзакцию настройки от первого аккаунта anvil.
+        Ненулевая приоритетная комиссия нужна, чтобы fee_history бота не был пустым
+        :param function: вызов функции контракта
+        :return: None
+        """
+        tx = function.build_transaction({
+            'from': self.deployer.address,
+            'nonce': self.w3.eth.get_transaction_count(self.deployer.address),
+            'maxPriorityFeePerGas': 10 ** 8,
+            'maxFeePerGas': 10 ** 9,
+        })
+        signed_tx = self.deployer.sign_transaction(tx)
+        tx_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+        if receipt['status'] != 1:
+            raise Exception(f'Транзакция настройки моков упала: {tx_hash.hex()}')
+
+    def set_balance(self, address: str, amount_wei: int) -> None:
+        """
+        Устанавливает баланс ETH адреса
+        :param address: адрес
+        :param amount_wei: баланс в wei
+        :return: None
+        """
+        self.w3.provider.make_request('anvil_setBalance', [address, hex(amount_wei)])
+
+    def add_balance(self, address: str, amount_wei: int) -> None:
+        """
+        Добавляет ETH на адрес, используется фейковым выводом с OKX
+        :param address: адрес
+        :param amount_wei: сумма в wei
+        :return: None
+        """
+        balance = self.w3.eth.get_balance(Web3.to_checksum_address(address))
+        self.set_balance(address, balance + amount_wei)
@@ -0,0 +1,190 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.24;
+
+// Моки контрактов Linea для бенчмарка. Код ставится через anvil_setCode на боевые адреса,
+// поэтому конструкторов нет, а состояние задается вызовами init/mint/setReserves.
+
+contract MockToken {
+    mapping(address => uint256) public balanceOf;
+    mapping(address => mapping(address => uint256)) public allowance;
+    uint256 public totalSupply;
+    uint256 internal reserve0;
+    uint256 internal reserve1;
+
+    event Transfer(address indexed from, address indexed to, uint256 value);
+    event Approval(address indexed owner, address indexed spender, uint256 value);
+
+    function decimals() external pure returns (uint8) {
+        return 18;
+    }
+
+    function approve(address spender, uint256 value) external returns (bool) {
+        allowance[msg.sender][spender] = value;
+        emit Approval(msg.sender, spender, value);
+        return true;
+    }
+
+    function transfer(address to, uint256 value) external returns (bool) {
+        _transfer(msg.sender, to, value);
+        return true;
+    }
+
+    function transferFrom(address from, address to, uint256 value) external returns (bool) {
+        uint256 allowed = allowance[from][msg.sender];
+        if (allowed != type(uint256).max) {
+            require(allowed >= value, "allowance");
+            allowance[from][msg.sender] = allowed - value;
+        }
+        _transfer(from, to, value);
+        return true;
+    }
+
+    function mint(address to, uint256 value) external {
+        totalSupply += value;
+        balanceOf[to] += value;
+        emit Transfer(address(0), to, value);
+    }
+
+    function burn(address from, uint256 value) external {
+        require(balanceOf[from] >= value, "balance");
+        balanceOf[from] -= value;
+        totalSupply -= value;
+        emit Transfer(from, address(0), value);
+    }
+
+    function setReserves(uint256 token, uint256 eth) external {
+        reserve0 = token;
+        reserve1 = eth;
+    }
+
+    function getReserves() external view returns (uint256, uint256, uint256) {
+        return (reserve0, reserve1, block.timestamp);
+    }
+
+    function _transfer(address from, address to, uint256 value) internal {
+        require(balanceOf[from] >= value, "balance");
+        balanceOf[from] -= value;
+        balanceOf[to] += value;
+        emit Transfer(from, to, value);
+    }
+}
+
+contract MockRouter {
+    address public weth;
+    mapping(address => address) public pairs;
+
+    receive() external payable {}
+
+    function init(address weth_, address token, address pair) external {
+        weth = weth_;
+        pairs[token] = pair;
+    }
+
+    function getReserves(address tokenA, address, bool) external view returns (uint256, uint256) {
+        (uint256 token, uint256 eth,) = MockToken(pairs[tokenA]).getReserves();
+        return (token, eth);
+    }
+
+    function addLiquidityETH(
+        address token,
+        bool,
+        uint256 amountTokenDesired,
+        uint256 amountTokenMin,
+        uint256 amountETHMin,
+        address to,
+        uint256 deadline
+    ) external payable returns (uint256, uint256, uint256 liquidity) {
+        require(deadline >= block.timestamp, "expired");
+        require(amountTokenDesired >= amountTokenMin && msg.value >= amountETHMin, "slippage");
+        MockToken pair = MockToken(pairs[token]);
+        (uint256 reserveToken, uint256 reserveEth,) = pair.getReserves();
+        MockToken(token).transferFrom(msg.sender, address(pair), amountTokenDesired);
+        liquidity = msg.value * pair.totalSupply() / reserveEth;
+        pair.setReserves(reserveToken + amountTokenDesired, reserveEth + msg.value);
+        pair.mint(to, liquidity);
+        return (amountTokenDesired, msg.value, liquidity);
+    }
+
+    function removeLiquidityETH(
+        address token,
+        bool,
+        uint256 liquidity,
+        uint256 amountTokenMin,
+        uint256 amountETHMin,
+        address to,
+        uint256 deadline
+    ) external returns (uint256 amountToken, uint256 amountETH) {
+        require(deadline >= block.timestamp, "expired");
+        MockToken pair = MockToken(pairs[token]);
+        (uint256 reserveToken, uint256 reserveEth,) = pair.getReserves();
+        uint256 supply = pair.totalSupply();
+        amountToken = liquidity * reserveToken / supply;
+        amountETH = liquidity * reserveEth / supply;
+        require(amountToken >= amountTokenMin && amountETH >= amountETHMin, "slippage");
+        pair.transferFrom(msg.sender, address(this), liquidity);
+        pair.burn(address(this), liquidity);
+        pair.setReserves(reserveToken - amountToken, reserveEth - amountETH);
+        MockToken(token).burn(address(pair), amountToken);
+        MockToken(token).mint(to, amountToken);
+        payable(to).transfer(amountETH);
+    }
+}
+
+contract MockSwapRouter {
+    mapping(address => address) public pairs;
+
+    receive() external payable {}
+
+    function init(address token, address pair) external {
+        pairs[token] = pair;
+    }
+
+    // from == address(0) означает продажу ETH
+    function swap(address from, address to, uint256 amount) external payable {
+        if (from == address(0)) {
+            require(msg.value == amount, "value");
+            (uint256 reserveToken, uint256 reserveEth,) = MockToken(pairs[to]).getReserves();
+            MockToken(to).mint(msg.sender, amount * reserveToken / reserveEth);
+        } else {
+            (uint256 reserveToken, uint256 reserveEth,) = MockToken(pairs[from]).getReserves();
+            MockToken(from).transferFrom(msg.sender, address(this), amount);
+            payable(msg.sender).transfer(amount * reserveEth / reserveToken);
+        }
+    }
+}
+
+contract MockLocker {
+    address public underlying;
+    address public voting;
+
+    function init(address underlying_, address voting_) external {
+        underlying = underlying_;
+        voting = voting_;
+    }
+
+    function createLock(uint256 value, uint256, bool) external returns (uint256) {
+        MockToken(underlying).transferFrom(msg.sender, address(this), value);
+        MockToken(voting).mint(msg.sender, value);
+        return 1;
+    }
+}
+
+contract MockZerolend {
+    address public aToken;
+
+    receive() external payable {}
+
+    function init(address aToken_) external {
+        aToken = aToken_;
+    }
+
+    function depositETH(address, address onBehalfOf, uint16) external payable {
+        MockToken(aToken).mint(onBehalfOf, msg.value);
+    }
+
+    function withdrawETH(address, uint256 amount, address to) external {
+        MockToken(aToken).transferFrom(msg.sender, address(this), amount);
+        MockToken(aToken).burn(address(this), amount);
+        payable(to).transfer(amount);
+    }
+}
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import socket
+from collections import Counter
+from decimal import Decimal
+
+from aiohttp import ClientSession, web
+from eth_abi import encode
+from playwright.async_api import async_playwright, Browser
+from web3 import Web3
+
+from benchmark.chain import Chain, SWAP_ROUTER, BENCHMARK_PATH
+
+ETH_PRICE = 2500
+SWAP_SELECTOR = Web3.keccak(text='swap(address,address,uint256)')[:4]
+
+
+def get_free_port() -> int:
+    """
+    Находит свободный локальный порт
+    :return: номер порта
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class FakeServices:
+    """
+    Локальные заменители внешних сервисов на одном http сервере:
+    AdsPower Local API с headless Chromium, API Wowmax, API OKX, страницы MetaMask и intract
+    и прокси к anvil, который считает RPC запросы по методам
+    """
+
+    def __init__(self, chain: Chain, port: int) -> None:
+        self.chain = chain
+        self.port = port
+        self.url = f'http://127.0.0.1:{port}'
+        self.rpc_calls: Counter[str] = Counter()
+        self.browsers: dict[int, Browser] = {}
+        self.endpoints: dict[int, str] = {}
+        self._playwright = None
+        self._runner: web.AppRunner | None = None
+        self._rpc_session: ClientSession | None = None
+
+    async def start(self) -> None:
+        """
+        Запускает http сервер
+        :return: None
+        """
+        app = web.Application()
+        app.add_routes([
+            web.get('/ads/api/v1/browser/active', self.browser_active),
+            web.get('/ads/api/v1/browser/start', self.browser_start),
+            web.get('/ads/api/v1/browser/stop', self.browser_stop),
+            web.get('/ads/api/v1/user/list', self.user_list),
+            web.post('/ads/api/v1/user/update', self.user_update),
+            web.get('/wowmax/prices', self.prices),
+            web.get('/wowmax/chains/59144/swap', self.swap),
+            web.get('/okx/api/v5/asset/currencies', self.okx_currencies),
+            web.post('/okx/api/v5/asset/withdrawal', self.okx_withdrawal),
+            web.get('/okx/api/v5/asset/deposit-withdraw-status', self.okx_status),
+            web.get('/metamask', self.static('metamask.html')),
+            web.get('/intract', self.static('intract.html')),
+            web.post('/rpc', self.rpc),
+        ])
+        self._playwright = await async_playwright().start()
+        self._rpc_session = ClientSession()
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, '127.0.0.1', self.port).start()
+
+    async def stop(self) -> None:
+        """
+        Закрывает браузеры и останавливает сервер
+        :return: None
+        """
+        for browser in self.browsers.values():
+            await browser.close()
+        await self._rpc_session.close()
+        await self._runner.cleanup()
+        await self._playwright.stop()
+
+    @staticmethod
+    def static(file_name: str):
+        """
+        Обработчик, отдающий статичную html страницу
+        :param file_name: имя файла в benchmark/static
+        :return: обработчик aiohttp
+        """
+        async def handler(_: web.Request) -> web.FileResponse:
+            return web.FileResponse(os.path.join(BENCHMARK_PATH, 'static', file_name))
+        return handler
+
+    async def browser_active(self, request: web.Request) -> web.Response:
+        profile_number = int(request.query['serial_number'])
+        if profile_number in self.browsers:
+            data = {'status': 'Active', 'ws': {'puppeteer': self.endpoints[profile_number]}}
+        else:
+            data = {'status': 'Inactive'}
+        return web.json_response({'code': 0, 'data': data})
+
+    async def browser_start(self, request: web.Request) -> web.Response:
+        profile_number = int(request.query['serial_number'])
+        port = get_free_port()
+        self.browsers[profile_number] = await self._playwright.chromium.launch(
+            headless=True, args=[f'--remote-debugging-port={port}'])
+        self.endpoints[profile_number] = f'http://127.0.0.1:{port}'
+        return web.json_response({'code': 0, 'data': {'ws': {'puppeteer': self.endpoints[profile_number]}}})
+
+    async def browser_stop(self, request: web.Request) -> web.Response:
+        profile_number = int(request.query['serial_number'])
+        if browser := self.browsers.pop(profile_number, None):
+            await browser.close()
+        return web.json_response({'code': 0, 'data': {}})
+
+    async def user_list(self, request: web.Request) -> web.Response:
+        return web.json_response({'code': 0, 'data': {'list': [{'user_id': request.query['serial_number']}]}})
+
+    async def user_update(self, _: web.Request) -> web.Response:
+        return web.json_response({'code': 0, 'data': {}})
+
+    async def prices(self, _: web.Request) -> web.Response:
+        return web.json_response([{'symbol': 'ETH', 'price': ETH_PRICE}])
+
+    async def swap(self, request: web.Request) -> web.Response:
+        """
+        Отдает данные для вызова MockSwapRouter.swap, получатель - отправитель транзакции
+        """
+        from_token = request.query['from']
+        to_token = request.query['to']
+        from_address = '0x' + '0' * 40 if from_token == 'ETH' else from_token
+        to_address = '0x' + '0' * 40 if to_token == 'ETH' else to_token
+        amount = int(Decimal(request.query['amount']) * 10 ** 18)
+        data = SWAP_SELECTOR + encode(['address', 'address', 'uint256'], [from_address, to_address, amount])
+        return web.json_response({'contract': SWAP_ROUTER, 'data': '0x' + data.hex()})
+
+    async def okx_currencies(self, _: web.Request) -> web.Response:
+        return web.json_response({'code': '0', 'data': [{'chain': 'ETH-Linea', 'minFee': '0.0001'}]})
+
+    async def okx_withdrawal(self, request: web.Request) -> web.Response:
+        """
+        Имитирует вывод с биржи, сразу зачисляя ETH на адрес в anvil
+        """
+        body = await request.json()
+        amount_wei = int(Decimal(str(body['amt'])) * 10 ** 18)
+        await asyncio.to_thread(self.chain.add_balance, body['toAddr'], amount_wei)
+        return web.json_response({'code': '0', 'data': [{'wdId': '1'}]})
+
+    async def okx_status(self, _: web.Request) -> web.Response:
+        return web.json_response({'code': '0', 'data': [{'state': 'Withdrawal complete'}]})
+
+    async def rpc(self, request: web.Request) -> web.Response:
+        """
+        Пересылает JSON-RPC запрос в anvil и считает вызовы по методам
+        """
+        body = await request.json()
+        for call in body if isinstance(body, list) else [body]:
+            self.rpc_calls[call['method']] += 1
+        async with self._rpc_session.post(self.chain.rpc, json=body) as response:
+            return web.json_response(await response.json())
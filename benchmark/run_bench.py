@@ -0,0 +1,155 @@
+"""
+Офлайн бенчмарк полного цикла run.main на локальных заменителях сервисов.
+
+Нужны anvil и forge (Foundry) в PATH и установленный Chromium для Playwright.
+Запуск из корня проекта:
+    python -m benchmark.run_bench --accounts 5 --threads 2
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import yaml
+from eth_account import Account as EthAccount
+
+from benchmark.chain import Chain
+from benchmark.fakes import FakeServices, get_free_port, ETH_PRICE
+
+PROJECT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def prepare_workspace(args: argparse.Namespace, fakes_url: str) -> list[str]:
+    """
+    Создает временную рабочую папку с конфигом, указывающим на локальные заменители, и переходит в нее
+    :param args: аргументы командной строки
+    :param fakes_url: адрес сервера заменителей
+    :return: список приватных ключей аккаунтов
+    """
+    workspace = tempfile.mkdtemp(prefix='linea-bench-')
+    data_path = os.path.join(workspace, 'config', 'data')
+    os.makedirs(data_path)
+    os.makedirs(os.path.join(workspace, 'database'))
+    os.symlink(os.path.join(PROJECT_PATH, 'config', 'data', 'ABIs'), os.path.join(data_path, 'ABIs'))
+
+    private_keys = [EthAccount.create().key.hex() for _ in range(args.accounts)]
+    profiles = [str(number) for number in range(1, args.accounts + 1)]
+    files = {
+        'profiles.txt': profiles,
+        'private_keys.txt': private_keys,
+        'passwords.txt': ['password'] * args.accounts,
+        'proxies.txt': [],
+        'withdraw_addresses.txt': [EthAccount.create().address for _ in profiles],
+    }
+    for file_name, lines in files.items():
+        with open(os.path.join(data_path, file_name), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines))
+
+    settings = {
+        'threads': args.threads,
+        'is_withdraw_to_wallet': True,
+        'okx': {'okx_api_key': 'bench', 'okx_secret_key': 'bench', 'okx_passphrase': 'bench'},
+        'rpc_linea': f'{fakes_url}/rpc',
+        'metamask_url': f'{fakes_url}/metamask',
+        'gas_multiple': [0.97, 1.05],
+        'gas_limit_multiple': [1.2, 1.3],
+        'shuffle_profiles': False,
+        'use_proxy': False,
+        'is_mobile_proxy': False,
+        'link_change_ip': '',
+        'is_withdraw_to_cex': True,
+        'min_balance': [0.002, 0.003],
+        'tg_token': '',
+        'tg_chat_id': '',
+        'ads_api_url': f'{fakes_url}/ads/api/v1/',
+        'wowmax_api_url': f'{fakes_url}/wowmax',
+        'intract_quest_url': f'{fakes_url}/intract',
+        'okx_domain': f'{fakes_url}/okx',
+    }
+    with open(os.path.join(workspace, 'config', 'settings.yaml'), 'w', encoding='utf-8') as f:
+        yaml.safe_dump(settings, f, allow_unicode=True)
+
+    os.chdir(workspace)
+    return private_keys
+
+
+async def run_benchmark(args: argparse.Namespace) -> dict:
+    """
+    Поднимает anvil и заменители, запускает run.main и собирает отчет
+    :param args: аргументы командной строки
+    :return: отчет
+    """
+    chain = Chain(get_free_port())
+    fakes = FakeServices(chain, get_free_port())
+    private_keys = prepare_workspace(args, fakes.url)
+
+    chain.start()
+    try:
+        await fakes.start()
+        chain.setup()
+        # баланс ниже 16$, чтобы каждый аккаунт проходил и через вывод с OKX
+        for private_key in private_keys:
+            chain.set_balance(EthAccount.from_key(private_key).address, int(10 / ETH_PRICE * 10 ** 18))
+        # деплой и пополнение не входят в замер, считаем только запросы самого запуска
+        fakes.rpc_calls.clear()
+
+        # импорт после подготовки рабочей папки, loader читает конфиг при импорте
+        import run
+        from database import Accounts, initialize_database, close_database
+        from utils import setup, metrics
+
+        setup(run.config.log_debug_sample_rate)
+        started = time.perf_counter()
+        await run.main()
+        elapsed = time.perf_counter() - started
+
+        await initialize_database()
+        completed = len(await Accounts.get_complete_accounts())
+        await close_database()
+    finally:
+        await fakes.stop()
+        chain.stop()
+
+    rpc_total = sum(fakes.rpc_calls.values())
+    return {
+        'accounts': args.accounts,
+        'threads': args.threads,
+        'completed': completed,
+        'elapsed_seconds': round(elapsed, 1),
+        'accounts_per_hour': round(completed / elapsed * 3600, 2),
+        'rpc_calls_per_account': round(rpc_total / args.accounts, 1),
+        'rpc_calls_by_method': dict(fakes.rpc_calls.most_common()),
+        'stages': {
+            stage: {
+                'count': len(samples),
+                'total_seconds': round(sum(samples), 2),
+                'p50_seconds': round(metrics.percentile(stage, 50), 2),
+                'p95_seconds': round(metrics.percentile(stage, 95), 2),
+            }
+            for stage, samples in metrics.samples.items()
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Офлайн бенчмарк Linea Intract')
+    parser.add_argument('--accounts', type=int, default=5, help='количество аккаунтов')
+    parser.add_argument('--threads', type=int, default=2, help='количество одновременных потоков')
+    parser.add_argument('--json', help='путь для сохранения отчета в json')
+    args = parser.parse_args()
+    if args.json:
+        args.json = os.path.abspath(args.json)
+
+    report = asyncio.run(run_benchmark(args))
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
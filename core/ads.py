@@ -1,20 +1,33 @@
 from __future__ import annotations
 
 from typing import Optional
+from urllib.parse import urlsplit
 import asyncio
+import base64
 
 from aiohttp import ClientSession
 from loguru import logger
 
-from playwright.async_api import async_playwright, Browser, BrowserContext, Page, Locator
+from playwright.async_api import async_playwright, Browser, BrowserContext, Page, Locator, Route
 
 from models import Account
 from loader import config, lock
-from utils import random_sleep
-from utils import get_request
+from utils import random_sleep, metrics
+from utils import get_request, proxy_clients, retry, BROWSER_POLICY
+
+# в облегченном режиме страниц шрифты и видео не загружаются, картинки подменяются пустым пикселем,
+# чтобы верстка и проверки видимости значков не менялись
+BLOCKED_RESOURCE_TYPES = {'font', 'media'}
+BLOCKED_DOMAINS = (
+    'google-analytics.com', 'googletagmanager.com', 'doubleclick.net', 'facebook.net', 'hotjar.com',
+    'mixpanel.com', 'segment.io', 'segment.com', 'amplitude.com', 'clarity.ms', 'intercom.io', 'sentry.io',
+)
+TRANSPARENT_PIXEL = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII=')
+
 
 class Ads:
-    local_api_url = "http://local.adspower.net:50325/api/v1/"
+    local_api_url = config.ads_api_url
 
     def __init__(self, account: Account):
         self.account = account
@@ -36,18 +49,45 @@ class Ads:
                 logger.error(
                     f'{self.profile_number}: Ошибка заполните файл с прокси или отключите использование прокси"')
                 exit()
+            # медленный или мертвый прокси отсеиваем до запуска браузера
+            if not await proxy_clients.probe(self.proxy.as_url, config.ip_check_url, config.proxy_max_latency,
+                                             config.proxy_max_failure_rate):
+                raise Exception(f"{self.profile_number}: прокси не отвечает или слишком медленный")
             await self.set_proxy()
 
         # запуск и настройка браузера
         try:
-            self.browser = await self._start_browser()
+            with metrics.span('ads_start', self.profile_number):
+                self.browser = await self._start_browser()
             self.context = self.browser.contexts[0]
+            if config.light_pages:
+                await self.context.route('**/*', self._route_light)
             self.page = await self.context.new_page()
             await self._prepare_browser()
         except Exception as e:
             logger.error(f"{self.profile_number}: Ошибка при запуске и настройке браузера: {e}")
             raise e
 
+    @staticmethod
+    async def _route_light(route: Route) -> None:
+        """
+        Обработчик запросов облегченного режима: блокирует трекеры, шрифты и видео, подменяет картинки.
+        Страницы расширений не трогаем
+        :param route: перехваченный запрос
+        :return: None
+        """
+        request = route.request
+        if request.url.startswith('chrome-extension://'):
+            await route.continue_()
+            return
+        host = urlsplit(request.url).hostname or ''
+        if request.resource_type in BLOCKED_RESOURCE_TYPES or host.endswith(BLOCKED_DOMAINS):
+            await route.abort()
+        elif request.resource_type == 'image':
+            await route.fulfill(status=200, content_type='image/png', body=TRANSPARENT_PIXEL)
+        else:
+            await route.continue_()
+
     async def _open_browser(self) -> str:
         """
         Открывает браузер в ADS по номеру профиля
@@ -85,24 +125,28 @@ class Ads:
     async def _start_browser(self) -> Browser:
         """
         Запускает браузер в ADS по номеру профиля.
-        Делает 3 попытки прежде чем вызвать исключение.
+        Повторяет запуск по политике BROWSER_POLICY, при массовых сбоях ADS срабатывает предохранитель.
         :return: Browser
         """
-        for attempt in range(3):
-            try:
-                if not (endpoint := await self._check_browser_status()):
-                    logger.info(f"{self.profile_number}: Запускаем браузер")
-                    await asyncio.sleep(3)
-                    endpoint = await self._open_browser()
-                await asyncio.sleep(5)
-                pw = await async_playwright().start()
-                browser = await pw.chromium.connect_over_cdp(endpoint, slow_mo=1000)
-                if browser.is_connected():
-                    return browser
-                logger.error(f"{self.profile_number}: Error не удалось запустить браузер")
-            except Exception as e:
-                logger.error(f"{self.profile_number}: Error не удалось запустить браузер {e}")
-        raise Exception(f"{self.profile_number}: Error не удалось запустить браузер")
+        return await retry.run(self._connect_browser, BROWSER_POLICY, dependency='ads',
+                               description=f"{self.profile_number}: Запуск браузера")
+
+    async def _connect_browser(self) -> Browser:
+        """
+        Одна попытка открыть браузер в ADS и подключиться к нему по CDP
+        :return: Browser
+        """
+        if not (endpoint := await self._check_browser_status()):
+            logger.info(f"{self.profile_number}: Запускаем браузер")
+            await asyncio.sleep(3)
+            endpoint = await self._open_browser()
+        await asyncio.sleep(5)
+        pw = await async_playwright().start()
+        with metrics.span('cdp_connect', self.profile_number):
+            browser = await pw.chromium.connect_over_cdp(endpoint, slow_mo=1000)
+        if not browser.is_connected():
+            raise Exception(f"{self.profile_number}: Error браузер не подключился, disconnected")
+        return browser
 
     async def _prepare_browser(self) -> None:
         """
@@ -123,17 +167,23 @@ class Ads:
             logger.error(f"{self.profile_number}: Ошибка при закрытии страниц: {e}")
             raise e
 
-    async def close_browser(self) -> None:
+    async def close_browser(self, fast: bool = False) -> None:
         """
         Останавливает браузер в ADS по номеру профиля
+        :param fast: не ждать паузу перед запросом к ADS, например после ошибки аккаунта
         :return:
         """
-        await self.browser.close()
+        if self.browser:
+            try:
+                await asyncio.wait_for(self.browser.close(), timeout=10)
+            except Exception as e:
+                logger.warning(f"{self.profile_number} Браузер не закрылся через CDP, останавливаем через ADS: {e}")
 
         params = dict(serial_number=self.profile_number)
         url = self.local_api_url + 'browser/stop'
         async with lock:
-            await random_sleep(1, 2)
+            if not fast:
+                await random_sleep(1, 2)
             try:
                 await get_request(url, params)
             except Exception as e:
@@ -200,14 +250,6 @@ class Ads:
                                         headers={"Content-Type": "application/json"}) as response:
                     await response.text()
 
-        # смена ip мобильных прокси если включена
-        if config.is_mobile_proxy:
-            try:
-                await get_request(config.link_change_ip)
-            except:
-                logger.warning(f"{self.profile_number}: Ошибка смены ip мобильного прокси")
-                pass
-
     async def get_profile_id(self) -> str:
         """
         Запрашивает id профиля в ADS по номеру профиля
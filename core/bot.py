@@ -1,42 +1,64 @@
 import asyncio
 import random
+from typing import Optional
 
 from core.ads import Ads
+from core.context import AccountContext
+from core.deadlines import AccountDeadline
 from core.onchain import Tokens, Onchain
 from core.daps import Zeroland, Wowmax, Nile
+from core.signer import signer
 from loader import config
 from database import Accounts
 from models import Account, Quest
-from utils import random_sleep, get_request
+from utils import random_sleep, metrics, notifier
+from utils import retry, RetryableError, RPC_POLICY, BROWSER_POLICY, VERIFY_POLICY
 
 from loguru import logger
+from playwright.async_api import Locator, TimeoutError as PlaywrightTimeoutError
+
+# квесты, которые используют остаток позиций других квестов и выполняются после их вывода средств
+QUESTS_AFTER_CLEANUP = {4}
+# квесты, после которых выводятся средства
+QUESTS_WITH_CLEANUP = {1, 2, 3}
 
 
 class Bot:
 
-    def __init__(self, account: Account):
-        self.ads = Ads(account)
-        self.onchain = Onchain(account)
-        self.zeroland = Zeroland(account)
-        self.wowmax = Wowmax(account)
-        self.nile = Nile(account, self.wowmax)
+    def __init__(self, account: Account, ads: Optional[Ads] = None):
+        """
+        :param account: аккаунт
+        :param ads: уже запущенный и авторизованный браузер из пула прогрева
+        """
+        self.ads_ready = ads is not None
+        self.ads = ads or Ads(account)
+        self.context = AccountContext(account)
+        self.onchain = Onchain(self.context)
+        self.zeroland = Zeroland(self.context)
+        self.wowmax = Wowmax(self.context)
+        self.nile = Nile(self.context, self.wowmax)
 
     async def __aenter__(self):
-        await self.tg_alert(f"Запуск аккаунта {self.ads.profile_number}")
+        notifier.notify('started', self.ads.profile_number)
         logger.info(f"Запуск аккаунта {self.ads.profile_number}")
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        await self.ads.close_browser()
+        # при ошибке браузер закрывается без пауз, чтобы сразу освободить место для следующего аккаунта
+        try:
+            await self.ads.close_browser(fast=exc_type is not None)
+        except Exception as e:
+            logger.warning(f"{self.ads.profile_number}: Ошибка при закрытии браузера {e}")
+        signer.forget(self.onchain.private_key)
         if exc_type is None:
             logger.success(f"Аккаунт {self.ads.profile_number} завершен")
-            await self.tg_alert(f"Аккаунт {self.ads.profile_number} завершен")
+            notifier.notify('completed', self.ads.profile_number)
         elif issubclass(exc_type, asyncio.TimeoutError):
             logger.error(f"Аккаунт {self.ads.profile_number} завершен по таймауту")
-            await self.tg_alert(f"Аккаунт {self.ads.profile_number} завершен по таймауту")
+            notifier.notify('timeout', self.ads.profile_number)
         else:
             logger.error(f"Аккаунт {self.ads.profile_number} завершен с ошибкой {exc_val}")
-            await self.tg_alert(f"Аккаунт {self.ads.profile_number} завершен с ошибкой {exc_val}")
+            notifier.notify('failed', self.ads.profile_number, str(exc_val))
         return False
 
     async def run(self) -> None:
@@ -48,9 +70,14 @@ class Bot:
         :return: None
         """
         await Accounts.create_account(self.ads.profile_number, self.onchain.address)
+        self.deadline = AccountDeadline(self.ads.profile_number)
+        await self.context.load_eth_price()
 
-        await self.ads.run()
-        await self.ads.metamask.authorize()
+        if not self.ads_ready:
+            async with self.deadline.stage('browser'):
+                await self.ads.run()
+                with metrics.span('metamask_authorize', self.ads.profile_number):
+                    await self.ads.metamask.authorize()
 
         quests = [
             Quest(2, 'Supply any asset on Linea on Zerolend'),
@@ -59,11 +86,13 @@ class Bot:
             Quest(4, 'Stake Zero/ETH on Zerolend.')
         ]
         await self.shuffle_quest(quests)
-        await self.check_statuses(quests)
+        async with self.deadline.stage('check_statuses'):
+            await self.check_statuses(quests)
         await self.run_quests(quests)
 
         if config.is_withdraw_to_cex:
-            await self.onchain.withdraw_to_cex()
+            async with self.deadline.stage('withdraw'):
+                await self.onchain.withdraw_to_cex()
 
 
     async def shuffle_quest(self, quests: list[Quest]) -> None:
@@ -89,58 +118,149 @@ class Bot:
 
     async def run_quests(self, quests: list[Quest]) -> None:
         """
-        Запускает по очереди квесты из списка
+        Выполняет квесты кругами по три этапа: ончейн действия по всем невыполненным квестам круга,
+        проверка квестов на interact.io за один заход на страницу, вывод ликвидности.
+        Стейк квеста 4 идет отдельным кругом после вывода ликвидности квеста 1, чтобы застейкать остаток LP,
+        а не часть открытой позиции, как и при выполнении квестов по одному.
         :param quests: список квестов
         :return: None
         """
-        for attempt in range(3):
+        rounds = [
+            [quest for quest in quests if quest.number not in QUESTS_AFTER_CLEANUP],
+            [quest for quest in quests if quest.number in QUESTS_AFTER_CLEANUP],
+        ]
+        not_verified = []
+        for round_quests in rounds:
+            if round_quests:
+                not_verified += await self.run_round(round_quests)
+        if not_verified:
+            raise Exception(f"{self.ads.profile_number}: Квесты {not_verified} не пройдены")
+
+    async def run_round(self, quests: list[Quest]) -> list[int]:
+        """
+        Ончейн действия квестов, проверка на interact.io и вывод средств.
+        Каждый шаг повторяется отдельно, поэтому после ошибки продолжаем с упавшего шага, а не с начала.
+        Revert и нехватка средств не повторяются.
+        Средства выводятся и после ошибки по всем квестам, ончейн шаг которых запускался, кроме уже засчитанных
+        :param quests: квесты круга
+        :return: номера не засчитанных квестов
+        """
+        started = []
+        skipped = set()
+        pending = []
+        verified = []
+        try:
+            for quest in quests:
+                logger.info(f"{self.ads.profile_number}: Запускаем квест {quest.number} {quest.text}")
+                started.append(quest)
+                async with self.deadline.stage(f'quest_{quest.number}'):
+                    if await retry.run(lambda number=quest.number: self.run_quest(number), RPC_POLICY,
+                                       dependency=self.context.rpc_dependency, charge=False,
+                                       description=f"{self.ads.profile_number}: Квест {quest.number}"):
+                        pending.append(quest)
+                    else:
+                        skipped.add(quest.number)
+                        self.deadline.skip_sample()
+
+            if pending:
+                async with self.deadline.stage('verify_quests'):
+                    verified = await self.verify_pending(pending)
+        except BaseException:
+            # ликвидность выводим и после ошибки, исходная ошибка пробрасывается дальше
             try:
-                for quest in quests:
-                    logger.info(f"{self.ads.profile_number}: Запускаем квест {quest.number} {quest.text}")
-                    await self.run_quest(quest.number, quest.text)
-                break
+                await self.cleanup_quests([quest for quest in started if quest.number not in skipped])
             except Exception as e:
-                logger.error(f"{self.ads.profile_number}: Ошибка при выполнении квестов {e}")
-                if attempt == 2:
-                    raise e
+                logger.error(f"{self.ads.profile_number}: Ошибка при выводе средств после ошибки квестов {e}")
+            raise
 
-    async def run_quest(self, quest_number: int, quest_text: str) -> None:
+        # выводим и если проверка не прошла, чтобы средства не остались в протоколах
+        await self.cleanup_quests([quest for quest in started if quest.number not in skipped])
+        return [quest.number for quest in pending if quest.number not in verified]
+
+    async def cleanup_quests(self, quests: list[Quest]) -> None:
         """
-        Выполнение квеста.
-        :param quest_number: номер квеста
-        :param quest_text: текст квеста, для поиска кнопок.
-        :param attempts: количество попыток запустить квест
+        Выводит средства квестов, ошибка одного квеста не останавливает вывод по остальным
+        :param quests: квесты, ончейн шаг которых выполнялся
         :return: None
         """
+        failed = []
+        async with self.deadline.stage('cleanup'):
+            if not any(quest.number in QUESTS_WITH_CLEANUP for quest in quests):
+                self.deadline.skip_sample()
+            for quest in quests:
+                try:
+                    await retry.run(lambda number=quest.number: self.cleanup_quest(number), RPC_POLICY,
+                                    dependency=self.context.rpc_dependency, charge=False,
+                                    description=f"{self.ads.profile_number}: Вывод средств квеста {quest.number}")
+                except Exception as e:
+                    logger.error(f"{self.ads.profile_number}: Не удалось вывести средства квеста {quest.number} {e}")
+                    failed.append(quest.number)
+        if failed:
+            raise Exception(f"{self.ads.profile_number}: Не удалось вывести средства квестов {failed}")
+
+    async def verify_pending(self, quests: list[Quest]) -> list[int]:
+        """
+        Проверяет квесты на interact.io, незасчитанные перепроверяются с растущей паузой,
+        уже засчитанные повторно не проверяются
+        :param quests: квесты, ончейн часть которых выполнена
+        :return: номера засчитанных квестов
+        """
+        verified = []
+
+        async def verify() -> None:
+            remaining = [quest for quest in quests if quest.number not in verified]
+            verified.extend(await self.verify_quests(remaining))
+            if len(verified) < len(quests):
+                raise RetryableError(f"Квесты {[quest.number for quest in quests if quest.number not in verified]} "
+                                     f"еще не засчитаны")
+
+        try:
+            await retry.run(verify, VERIFY_POLICY, dependency='intract',
+                            description=f"{self.ads.profile_number}: Проверка квестов")
+        except RetryableError as e:
+            # остальные ошибки (браузер, недоступный intract) пробрасываются и завершают аккаунт
+            logger.warning(f"{self.ads.profile_number}: {e}")
+        return verified
+
+    async def run_quest(self, quest_number: int) -> bool:
+        """
+        Выполняет ончейн действие квеста, если квест еще не засчитан.
+        :param quest_number: номер квеста
+        :return: True если квест нужно проверить на interact.io
+        """
+        if await Accounts.get_status(self.ads.profile_number, quest_number):
+            return False
         try:
             if quest_number == 1:
-                if not await Accounts.get_status(self.ads.profile_number, quest_number):
-                    await self.nile.add_liquidity_eth(Tokens.ZERO)
-                    await self.interact_quest(quest_number, quest_text)
+                await self.nile.add_liquidity_eth(Tokens.ZERO)
+            elif quest_number == 2:
+                await self.zeroland.supply_zerolend()
+            elif quest_number == 3:
+                await self.nile.add_liquidity_eth(Tokens.NILE)
+            elif quest_number == 4:
+                await self.nile.stake()
+        except Exception as e:
+            logger.error(f"{self.ads.profile_number}: Ошибка при выполнении квеста {quest_number} {e}")
+            raise e
+        return True
 
+    async def cleanup_quest(self, quest_number: int) -> None:
+        """
+        Выводит ликвидность и средства после проверки квеста.
+        :param quest_number: номер квеста
+        :return: None
+        """
+        try:
+            if quest_number == 1:
                 await self.nile.remove_liquidity(Tokens.ZERO)
                 await self.wowmax.swap(Tokens.ZERO, Tokens.ETH)
-
             elif quest_number == 2:
-                if not await Accounts.get_status(self.ads.profile_number, quest_number):
-                    await self.zeroland.supply_zerolend()
-                    await self.interact_quest(quest_number, quest_text)
                 await self.zeroland.withdraw_zerolend()
-
             elif quest_number == 3:
-                if not await Accounts.get_status(self.ads.profile_number, quest_number):
-                    await self.nile.add_liquidity_eth(Tokens.NILE)
-                    await self.interact_quest(quest_number, quest_text)
                 await self.nile.remove_liquidity(Tokens.NILE)
                 await self.wowmax.swap(Tokens.NILE, Tokens.ETH)
-
-            elif quest_number == 4:
-                if not await Accounts.get_status(self.ads.profile_number, quest_number):
-                    await self.nile.stake()
-                    await self.interact_quest(quest_number, quest_text)
-
         except Exception as e:
-            logger.error(f"{self.ads.profile_number}: Ошибка при выполнении квеста {quest_number} {e}")
+            logger.error(f"{self.ads.profile_number}: Ошибка при выводе средств квеста {quest_number} {e}")
             raise e
 
     async def open_interact(self) -> None:
@@ -149,18 +269,8 @@ class Bot:
         :return: None
         """
 
-        for attempt in range(3):
-            try:
-                await self.ads.page.goto('https://www.intract.io/quest/66bb5618c8ff56cba848ea8f',
-                                         wait_until='load', timeout=30000)
-                break
-            except Exception:
-                if attempt == 2:
-                    raise Exception(f"{self.ads.profile_number} Не удалось открыть сайт interact.io")
-
-                logger.warning(
-                    f"{self.ads.profile_number}: Не удалось нормально открыть сайт interact.io, пробуем еще раз")
-                await random_sleep(3, 5)
+        await retry.run(self._goto_interact, BROWSER_POLICY, dependency='intract',
+                        description=f"{self.ads.profile_number}: Открытие interact.io")
 
         if await self.ads.page.get_by_text('Sign In').count():
             logger.info(f"{self.ads.profile_number}: Запускаем подключение кошелька")
@@ -176,46 +286,91 @@ class Bot:
                 await confirm_button.click()
                 await asyncio.sleep(5)
 
-    async def interact_quest(self, quest_number: int, quest_text: str) -> bool:
+    async def _goto_interact(self) -> None:
         """
-        Прокликивает задание на Zerolend
-        :return:
+        Одна попытка загрузить страницу квеста interact.io
+        :return: None
         """
-        if await Accounts.get_status(self.ads.profile_number, quest_number):
-            return True
-
-        logger.info(f"{self.ads.profile_number}: Пробуем пройти квест на interact {quest_number}")
+        with metrics.span('intract_open', self.ads.profile_number):
+            if config.light_pages:
+                # ждем блоки заданий, а не полную загрузку страницы со всеми ресурсами
+                await self.ads.page.goto(config.intract_quest_url, wait_until='domcontentloaded', timeout=30000)
+                await self.ads.page.locator(
+                    '//div[contains(@class, "task_trigger_container")]').first.wait_for(timeout=30000)
+            else:
+                await self.ads.page.goto(config.intract_quest_url, wait_until='load', timeout=30000)
+
+    async def verify_quests(self, quests: list[Quest]) -> list[int]:
+        """
+        Проверяет квесты на interact.io за один заход на страницу, вместо пауз ждет появления значка выполнения.
+        Статусы всех засчитанных квестов записываются в бд в конце через писатель статусов.
+        :param quests: квесты, ончейн часть которых выполнена
+        :return: номера засчитанных квестов
+        """
+        logger.info(f"{self.ads.profile_number}: Проверяем квесты на interact {[quest.number for quest in quests]}")
         await self.open_interact()
 
-        await random_sleep(3, 5)
+        verified = []
+        for quest in quests:
+            try:
+                if await self.verify_quest(quest.text):
+                    logger.info(f"{self.ads.profile_number}: Квест {quest.number} пройден")
+                    verified.append(quest.number)
+                else:
+                    logger.warning(f"{self.ads.profile_number}: Квест {quest.number} не засчитан")
+            except Exception as e:
+                logger.warning(f"{self.ads.profile_number}: Ошибка проверки квеста {quest.number} {e}")
+            await random_sleep(1, 2)
 
-        if await self.check_status(quest_number, quest_text):
-            logger.info(f"{self.ads.profile_number}: Квест {quest_number} пройден")
-            return True
+        # статусы пишутся через общий писатель статусов, он соберет их в одну транзакцию
+        await asyncio.gather(*(Accounts.change_status(self.ads.profile_number, quest_number)
+                               for quest_number in verified))
+        return verified
 
-        await self.ads.page.get_by_text(quest_text).scroll_into_view_if_needed(timeout=10000)
-        await self.ads.page.get_by_text(quest_text).click(timeout=10000)
-        await random_sleep(3, 5)
-        await self.ads.page.locator('div.modal-dialog:visible').get_by_role('button').filter(
-            has_not_text='Continue', has=self.ads.page.locator('i')).first.click(timeout=10000)
-        verify_button = self.ads.page.get_by_role('button', name='Verify')
+    async def verify_quest(self, quest_text: str) -> bool:
+        """
+        Прокликивает проверку одного квеста на уже открытой странице interact.io
+        :param quest_text: текст квеста, для поиска кнопок
+        :return: True если появился значок выполнения
+        """
+        page = self.ads.page
+        badge = self.quest_block(quest_text).get_by_alt_text('check task logo badge')
+        if await badge.is_visible():
+            return True
 
-        await verify_button.scroll_into_view_if_needed(timeout=10000)
+        await page.get_by_text(quest_text).click(timeout=10000)
+        await page.locator('div.modal-dialog:visible').get_by_role('button').filter(
+            has_not_text='Continue', has=page.locator('i')).first.click(timeout=10000)
+        verify_button = page.get_by_role('button', name='Verify')
         await verify_button.click(timeout=10000)
 
-        await random_sleep(5, 10)
-        if await self.ads.page.get_by_role('heading', name='Choose primary wallet').count():
-            await self.ads.page.locator('div.tab-link-text:visible').click(timeout=10000)
-            await self.ads.page.get_by_role('button', name='Confirm').click(timeout=10000)
-            await random_sleep(3, 5)
-            await verify_button.click(timeout=10000)
-            await random_sleep(5, 10)
-
-        if await self.check_status(quest_number, quest_text):
-            logger.info(f"{self.ads.profile_number}: Квест {quest_number} пройден")
-            return True
+        choose_wallet = page.get_by_role('heading', name='Choose primary wallet')
+        try:
+            await badge.or_(choose_wallet).first.wait_for(state='visible', timeout=30000)
+            if await choose_wallet.is_visible():
+                await page.locator('div.tab-link-text:visible').click(timeout=10000)
+                await page.get_by_role('button', name='Confirm').click(timeout=10000)
+                await verify_button.click(timeout=10000)
+                await badge.wait_for(state='visible', timeout=30000)
+        except PlaywrightTimeoutError:
+            pass
+        verified = await badge.is_visible()
+
+        # закрываем окно задания, чтобы перейти к следующему без перезагрузки страницы
+        await page.keyboard.press('Escape')
+        try:
+            await page.locator('div.modal-dialog').first.wait_for(state='hidden', timeout=5000)
+        except PlaywrightTimeoutError:
+            await self.open_interact()
+        return verified
 
-        raise Exception(f"{self.ads.profile_number}: Квест {quest_number} не пройден")
+    def quest_block(self, quest_text: str) -> Locator:
+        """
+        Блок задания на странице interact.io
+        :param quest_text: текст квеста
+        :return: локатор блока
+        """
+        return self.ads.page.locator('//div[contains(@class, "task_trigger_container")]', has_text=quest_text)
 
     async def check_status(self, quest_number: int, quest_text: str) -> bool:
         """
@@ -224,25 +379,7 @@ class Bot:
         :param quest_text:
         :return: True если квест пройден, False если нет
         """
-        quest_block = self.ads.page.locator('//div[contains(@class, "task_trigger_container")]',
-                                            has_text=quest_text)
-
-        if await quest_block.get_by_alt_text('check task logo badge').is_visible():
+        if await self.quest_block(quest_text).get_by_alt_text('check task logo badge').is_visible():
             await Accounts.change_status(self.ads.profile_number, quest_number)
             return True
         return False
-
-    async def tg_alert(self, message: str) -> None:
-        """
-        Отправляет сообщение в телеграм
-        :param message: текст сообщения
-        :return: None
-        """
-        if not config.tg_token:
-            return
-        try:
-            url = f"https://api.telegram.org/bot{config.tg_token}/sendMessage"
-            await get_request(url, {"chat_id": config.tg_chat_id, "text": message})
-        except Exception as e:
-            logger.error(f"Не удалось отправить сообщение в телеграм {e}")
-
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from collections import deque
+from typing import Callable, Optional
+
+from loguru import logger
+
+from core.ads import Ads
+from core.proxies import proxy_rotator
+from loader import config
+from models import Account
+from utils import metrics
+
+
+def available_ram_mb() -> Optional[int]:
+    """
+    Свободная оперативная память в мегабайтах
+    :return: мегабайты или None, если система не сообщает свободную память (Windows)
+    """
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') // 2 ** 20
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+class BrowserPool:
+    """
+    Пул прогретых браузеров: пока воркеры заняты ончейн работой, пул заранее запускает
+    браузеры ADS и авторизует метамаск для следующих профилей из очереди.
+    Размер пула ограничен настройкой warm_pool_size и свободной оперативной памятью
+    """
+
+    def __init__(self, get_account: Callable[[int], Account], size: int = 0) -> None:
+        self.get_account = get_account
+        self.size = size
+        self._pending: deque[int] = deque()
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    def _has_capacity(self) -> bool:
+        """
+        Проверяет, можно ли прогреть еще один браузер
+        :return: True если есть место в пуле и память
+        """
+        if len(self._tasks) >= self.size:
+            return False
+        free_ram = available_ram_mb()
+        return free_ram is None or free_ram - config.ram_reserve_mb >= config.browser_ram_mb
+
+    def schedule(self, profile_number: int) -> None:
+        """
+        Добавляет профиль в очередь на прогрев
+        :param profile_number: номер профиля
+        :return: None
+        """
+        if self.size:
+            self._pending.append(profile_number)
+            self._fill()
+
+    def _fill(self) -> None:
+        while self._pending and self._has_capacity():
+            profile_number = self._pending.popleft()
+            self._tasks[profile_number] = asyncio.create_task(self._warm(profile_number))
+
+    async def _warm(self, profile_number: int) -> Optional[Ads]:
+        """
+        Запускает браузер и авторизует метамаск
+        :param profile_number: номер профиля
+        :return: готовый Ads или None при ошибке
+        """
+        ads = Ads(self.get_account(profile_number))
+        try:
+            # модем остается за профилем, воркер не будет захватывать его заново
+            if config.use_proxy:
+                await proxy_rotator.acquire(profile_number, ads.proxy)
+            await ads.run()
+            with metrics.span('metamask_authorize', profile_number):
+                await ads.metamask.authorize()
+            logger.debug(f"{profile_number}: браузер прогрет")
+            return ads
+        except (Exception, asyncio.CancelledError) as error:
+            cancelled = isinstance(error, asyncio.CancelledError)
+            if not cancelled:
+                logger.warning(f"{profile_number}: не удалось прогреть браузер, запустим при старте аккаунта {error}")
+            # модем не держим, аккаунт захватит его и сменит ip заново при своем запуске
+            proxy_rotator.release(profile_number)
+            await self._close(ads)
+            if cancelled:
+                raise
+            return None
+
+    async def take(self, profile_number: int, timeout: Optional[float] = None) -> Optional[Ads]:
+        """
+        Забирает прогретый браузер профиля, если прогрев еще идет, дожидается его не дольше timeout.
+        Зависший прогрев отменяется, браузер закрывается
+        :param profile_number: номер профиля
+        :param timeout: сколько секунд ждать прогрева, None - без ограничения
+        :return: готовый Ads или None, если профиль не прогревался или прогрев не успел
+        """
+        if profile_number in self._pending:
+            self._pending.remove(profile_number)
+        task = self._tasks.pop(profile_number, None)
+        self._fill()
+        if task is None:
+            return None
+        try:
+            return await asyncio.wait_for(task, timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{profile_number}: браузер не прогрелся за {timeout} с, запустим при старте аккаунта")
+            return None
+
+    async def discard(self, profile_number: int) -> None:
+        """
+        Закрывает прогретый браузер профиля, который не будет выполняться.
+        Незавершенный прогрев не дожидается, а отменяется, браузер закрывает сам прогрев
+        :param profile_number: номер профиля
+        :return: None
+        """
+        if profile_number in self._pending:
+            self._pending.remove(profile_number)
+        task = self._tasks.pop(profile_number, None)
+        self._fill()
+        if task is not None:
+            if task.done():
+                if not task.cancelled() and (ads := task.result()):
+                    await self._close(ads)
+            else:
+                task.cancel()
+                await asyncio.wait([task])
+        proxy_rotator.release(profile_number)
+
+    async def stop(self) -> None:
+        """
+        Отменяет прогрев и закрывает неиспользованные браузеры
+        :return: None
+        """
+        self._pending.clear()
+        for profile_number in list(self._tasks):
+            await self.discard(profile_number)
+
+    @staticmethod
+    async def _close(ads: Ads) -> None:
+        try:
+            await ads.close_browser()
+        except Exception as error:
+            logger.warning(f"{ads.profile_number}: ошибка закрытия прогретого браузера {error}")
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from eth_account.datastructures import SignedTransaction
+from web3.types import TxParams, TxReceipt
+
+from core.okx_client import OKX
+from core.signer import signer
+from core.transactions import NonceManager, TransactionLifecycle
+from loader import config, w3
+from models import Account
+from utils import get_eth_price, get_proxy_w3, rpc_dependency
+
+
+ETH_BALANCE_KEY = 'eth'
+# keccak256('Transfer(address,address,uint256)')
+TRANSFER_TOPIC = bytes.fromhex('ddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef')
+
+
+class BalanceCache:
+    """
+    Кэш балансов аккаунта по токенам в wei. Баланс токена сбрасывается, когда в квитанции есть событие Transfer
+    этого токена с адресом аккаунта, баланс ETH - после каждой своей транзакции и вывода с биржи
+    """
+
+    def __init__(self, address: str) -> None:
+        self.address = bytes.fromhex(address.removeprefix('0x'))
+        self._balances: dict[str, int] = {}
+
+    def get(self, key: str) -> Optional[int]:
+        return self._balances.get(key)
+
+    def set(self, key: str, amount_wei: int) -> None:
+        self._balances[key] = amount_wei
+
+    def invalidate(self, key: str) -> None:
+        self._balances.pop(key, None)
+
+    def clear(self) -> None:
+        self._balances.clear()
+
+    def apply_receipt(self, receipt: TxReceipt) -> None:
+        """
+        Сбрасывает балансы, которые могла изменить транзакция
+        :param receipt: квитанция своей транзакции
+        :return: None
+        """
+        # газ и value списываются с ETH, а внутренние переводы ETH не оставляют событий
+        self.invalidate(ETH_BALANCE_KEY)
+        for log in receipt['logs']:
+            topics = log['topics']
+            if len(topics) < 3 or bytes(topics[0]) != TRANSFER_TOPIC:
+                continue
+            if bytes(topics[1])[-20:] == self.address or bytes(topics[2])[-20:] == self.address:
+                self.invalidate(log['address'].lower())
+
+
+class AccountContext:
+    """
+    Общее состояние аккаунта для всех протоколов: адрес, подпись, nonce, w3 через прокси,
+    клиент OKX, кэш балансов и разрешений токенов. Создается один раз на аккаунт и передается в Onchain и протоколы
+    """
+
+    def __init__(self, account: Account):
+        self.account = account
+        self.profile_number = account.profile_number
+        self.private_key = account.private_key
+        self.withdraw_address = account.withdraw_address
+        # API и RPC запросы аккаунта идут через его прокси
+        self.proxy = account.proxy.as_url if config.use_proxy and config.proxy_api_traffic else None
+        self.w3 = get_proxy_w3(config.rpc_linea, self.proxy) if self.proxy else w3
+        # имя предохранителя RPC, которым пользуется аккаунт
+        self.rpc_dependency = rpc_dependency(self.proxy)
+        self.address = signer.account(account.private_key).address
+        self.nonces = NonceManager(self.w3, self.address)
+        self.transactions = TransactionLifecycle(self.w3, self.profile_number, self.sign, self.nonces)
+        self.okx = OKX(account) if config.is_withdraw_to_wallet else None
+        # известные разрешения: (токен, spender) - сумма в wei
+        self.allowances: dict[tuple[str, str], int] = {}
+        self.balances = BalanceCache(self.address)
+        self._eth_price: Optional[float] = None
+
+    @property
+    def eth_price(self) -> float:
+        """
+        Цена ETH, загруженная в начале работы аккаунта
+        :return: цена ETH
+        """
+        if self._eth_price is None:
+            raise Exception(f"{self.profile_number}: цена ETH не загружена")
+        return self._eth_price
+
+    async def load_eth_price(self) -> float:
+        """
+        Запрашивает цену ETH один раз на аккаунт, дальше протоколы читают ее синхронно через eth_price
+        :return: цена ETH
+        """
+        if self._eth_price is None:
+            self._eth_price = await get_eth_price(config.wowmax_api_url, self.proxy)
+        return self._eth_price
+
+    async def sign(self, tx: TxParams) -> SignedTransaction:
+        """
+        Подписывает транзакцию приватным ключом в пуле потоков сервиса подписи
+        :param tx: параметры транзакции
+        :return: подписанная транзакция
+        """
+        return await signer.sign_transaction(self.private_key, tx)
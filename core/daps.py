@@ -1,23 +1,25 @@
 import random
 from datetime import datetime, timedelta
+from decimal import Decimal
 from typing import Optional
 
 from eth_typing import HexStr
 from web3.types import TxParams
 from loguru import logger
 
+from core.context import AccountContext, ETH_BALANCE_KEY
 from core.onchain import Onchain, Contracts, Tokens
 from loader import config
-from models import ContractTemp, Account, Amount
-from utils import random_amount, random_sleep, get_eth_price
+from models import ContractTemp, Amount
+from utils import random_amount, random_sleep, metrics
 
 from utils.utils import get_request
 
 
 class Daps(Onchain):
-    def __init__(self, account: Account):
-        super().__init__(account)
-        self.eth_price = get_eth_price()
+    @property
+    def eth_price(self) -> float:
+        return self.ctx.eth_price
 
     async def get_swap_price(self, token: ContractTemp) -> Amount:
         contract_router = self.get_contract(Contracts.nile_router)
@@ -27,7 +29,7 @@ class Daps(Onchain):
             weth_address,
             False
         ).call()
-        return Amount(reserves[0] / reserves[1])
+        return Amount(Decimal(reserves[0]) / Decimal(reserves[1]))
 
     async def balance_check_and_popup(self) -> None:
         """
@@ -39,16 +41,15 @@ class Daps(Onchain):
             if config.is_withdraw_to_wallet:
                 random_round = random.randint(5, 7)
                 amount = random_amount(20 / self.eth_price, 25 / self.eth_price, round_n=random_round)
-                await self.okx.okx_withdraw(self.address, 'Linea', 'ETH', amount)
+                with metrics.span('okx_withdrawal', self.profile_number):
+                    await self.okx.okx_withdraw(self.address, 'Linea', 'ETH', amount)
+                self.ctx.balances.invalidate(ETH_BALANCE_KEY)
             else:
                 logger.error(f"{self.profile_number}: Недостаточно баланса ETH для работы, пополните баланс")
                 raise Exception("Недостаточно баланса ETH для работы, пополните баланс")
 
 
 class Wowmax(Daps):
-    def __init__(self, account: Account):
-        super().__init__(account)
-
     async def swap(self, from_token: ContractTemp, to_token: ContractTemp,
                    amount_from: Optional[Amount] = None) -> None:
         """
@@ -64,7 +65,7 @@ class Wowmax(Daps):
             # проверяем что баланс токена больше 1$
             token_balance = await self.get_balance(from_token)
             token_price_in_eth = await self.get_swap_price(from_token)
-            if token_balance.ether_float < 1 / token_price_in_eth.ether_float:
+            if token_balance < 1 / token_price_in_eth.ether:
                 logger.warning(
                     f"{self.profile_number}: Баланс токена меньше 1$ - {token_balance}, пропускаем свап")
                 return
@@ -78,7 +79,7 @@ class Wowmax(Daps):
 
         # получаем путь для обмена и данные по обмену
         r = await self.get_data(from_token, to_token, amount_from)
-        wowmax_event_router = ContractTemp(r['contract'])
+        wowmax_event_router = ContractTemp.get(r['contract'])
 
         # если меняем токен на эфир, то даем апрув контракту
         if from_token != Tokens.ETH:
@@ -92,13 +93,13 @@ class Wowmax(Daps):
         value = amount_from if from_token == Tokens.ETH else Amount(0)
         tx = await self.prepare_transaction(tx_params=tx_params, value=value.wei)
 
-        tx_receipt = await self.send_transaction(tx)
+        # газ роутера зависит от маршрута из API, лимит всегда считается через estimate_gas
+        tx_receipt = await self.send_transaction(tx, use_gas_cache=False)
         logger.info(
             f"{self.profile_number}: Swap Wowmax {from_token} - {to_token}: {tx_receipt['transactionHash'].hex()}")
         await random_sleep(5, 10)
 
-    @staticmethod
-    async def get_data(from_token: ContractTemp, to_token: ContractTemp, amount: Amount) -> dict:
+    async def get_data(self, from_token: ContractTemp, to_token: ContractTemp, amount: Amount) -> dict:
         """
         Получает данные по API для транзакции
         :param from_token: покупаемый токен
@@ -106,19 +107,19 @@ class Wowmax(Daps):
         :param amount: сумма обмена
         :return: данные по обмену
         """
-        uri = 'https://api-gateway.wowmax.exchange/chains/59144/swap'
+        uri = f'{config.wowmax_api_url}/chains/59144/swap'
         params = {
             'from': from_token.address,
             'to': to_token.address,
             'amount': str(amount.ether),
             'slippage': 5
         }
-        return await get_request(uri, params)
+        return await get_request(uri, params, self.proxy)
 
 
 class Nile(Daps):
-    def __init__(self, account: Account, wowmax: Wowmax):
-        super().__init__(account)
+    def __init__(self, context: AccountContext, wowmax: Wowmax):
+        super().__init__(context)
         self.wowmax = wowmax
 
     async def add_liquidity_eth(self, token: ContractTemp) -> None:
@@ -136,26 +137,26 @@ class Nile(Daps):
         lp_price = await self.get_lp_price(token)
 
         # Если баланс lp токенов больше 15$ не добавляем ликвидность
-        if lp_balance.ether_float > 15 / lp_price.ether_float:
+        if lp_balance > 15 / lp_price.ether:
             logger.warning(f"{self.profile_number}: Ликвидность уже добавлена  {lp_balance}")
             return
 
         # получаем баланс токена и цену токена в eth и usd
         token_balance = await self.get_balance(token)
         token_price_in_eth = await self.get_swap_price(token)
-        token_price_in_usd = Amount(token_price_in_eth.ether_float / self.eth_price)
+        token_price_in_usd = token_price_in_eth / self.eth_price
 
         # Если баланс токена меньше 7.5$ покупаем токен
-        if token_balance.ether_float < 7.5 * token_price_in_usd.ether_float:
+        if token_balance < token_price_in_usd * Decimal('7.5'):
             # считаем сколько еще нужно токенов
-            need_token = 8 * token_price_in_usd.ether_float - token_balance.ether_float
+            need_token = token_price_in_usd * 8 - token_balance
             # считаем сумму эфира на которую нужно закупить токен
-            swap_amount = Amount(need_token / token_price_in_eth.ether_float)
+            swap_amount = Amount(need_token / token_price_in_eth)
             await self.wowmax.swap(Tokens.ETH, token, swap_amount)
 
         # Получаем баланс токена и делаем апрув контракту
         token_contract = self.get_contract(token)
-        amount_token = Amount(await token_contract.functions.balanceOf(self.address).call(), wei=True)
+        amount_token = await self.get_balance(token)
         await self.approve(token_contract, Contracts.nile_router, amount_token)
 
         # получаем адрес WETH, получаем резервы пула и высчитываем минимальное количество ETH
@@ -166,7 +167,7 @@ class Nile(Daps):
             weth_address,
             False
         ).call()
-        amount_eth = Amount(amount_token.wei * reserves[1] / reserves[0], wei=True)
+        amount_eth = amount_token.mul_div(reserves[1], reserves[0])
 
         # упаковываем параметры и отправляем транзакцию
         deadline = datetime.now() + timedelta(days=1)
@@ -174,8 +175,8 @@ class Nile(Daps):
             token.address,
             False,
             amount_token.wei,
-            int(amount_token.wei * 0.98),
-            int(amount_eth.wei * 0.98),
+            amount_token.mul_div(98, 100).wei,
+            amount_eth.mul_div(98, 100).wei,
             self.address,
             int(deadline.timestamp())
         ).build_transaction(await self.prepare_transaction(value=amount_eth.wei))
@@ -190,28 +191,30 @@ class Nile(Daps):
         :param token: токен в паре с эфиром
         :return: None
         """
-        lp_contract = self.get_contract(Tokens.get_lp_token(token))
-        balance_lp = Amount(await lp_contract.functions.balanceOf(self.address).call(), wei=True)
+        lp_token = Tokens.get_lp_token(token)
+        lp_contract = self.get_contract(lp_token)
+        balance_lp = await self.get_balance(lp_token)
 
         lp_price = await self.get_lp_price(token)
-        if balance_lp.ether_float < 0.5 / lp_price.ether_float:
+        if balance_lp < Decimal('0.5') / lp_price.ether:
             logger.warning(f"{self.profile_number}: Ликвидность уже выведена {balance_lp}")
             return
         await self.approve(lp_contract, Contracts.nile_router, balance_lp)
         reserves = await lp_contract.functions.getReserves().call()
         lp_supply = await lp_contract.functions.totalSupply().call()
 
+        # доля резервов считается в целых числах от фактически выводимой ликвидности
+        liquidity = balance_lp.mul_div(995, 1000)
         token_supply, eth_supply = reserves[0], reserves[1]
-        percent_lp = balance_lp.ether_float / lp_supply
-        token_min_amount = int(token_supply * percent_lp * .98)
-        eth_min_amount = int(eth_supply * percent_lp * .98)
+        token_min_amount = liquidity.wei * token_supply * 98 // (lp_supply * 100)
+        eth_min_amount = liquidity.wei * eth_supply * 98 // (lp_supply * 100)
 
         contract = self.get_contract(Contracts.nile_router)
         deadline = datetime.now() + timedelta(days=1)
         tx = await contract.functions.removeLiquidityETH(
             token.address,
             False,
-            int(balance_lp.wei * 0.995),
+            liquidity.wei,
             token_min_amount,
             eth_min_amount,
             self.address,
@@ -235,13 +238,13 @@ class Nile(Daps):
 
         # проверяем баланс lp токена
         lp_contract = self.get_contract(Tokens.LP_ZERO_WETH)
-        lp_balance = Amount(await lp_contract.functions.balanceOf(self.address).call(), wei=True)
+        lp_balance = await self.get_balance(Tokens.LP_ZERO_WETH)
 
         # выбираем рандомную сумму для стейка, если баланс меньше суммы, то стейкаем весь баланс
         lp_amount = Amount(random_amount(0.01, 0.2))
-        if lp_balance.ether_float < lp_amount.ether_float:
+        if lp_balance < lp_amount:
             random_percent = random_amount(0.98, 0.99, 3)
-            lp_amount = Amount(lp_balance.wei * random_percent, wei=True)
+            lp_amount = lp_balance * random_percent
 
         await self.approve(lp_contract, Contracts.nile_locker_lp, lp_amount)
 
@@ -267,15 +270,11 @@ class Nile(Daps):
         reserves = await lp_contract.functions.getReserves().call()
         lp_supply = Amount(await lp_contract.functions.totalSupply().call(), wei=True)
 
-        token_supply, eth_supply = reserves[0], Amount(reserves[1], wei=True)
-        lp_token_price = eth_supply.ether_float * self.eth_price * 2 / lp_supply.ether_float
-        return Amount(lp_token_price)
+        eth_supply = Amount(reserves[1], wei=True)
+        return Amount(eth_supply / lp_supply * Decimal(str(self.eth_price)) * 2)
 
 
 class Zeroland(Daps):
-    def __init__(self, account: Account):
-        super().__init__(account)
-
     async def supply_zerolend(self) -> None:
         """
         Добавляет ликвидность в Zerolend
@@ -283,9 +282,8 @@ class Zeroland(Daps):
         """
         zero_min_amount = Amount(random_amount(16 / self.eth_price, 17 / self.eth_price, round_n=6))
 
-        token_contract = self.get_contract(Tokens.ZERO_ETH)
-        zero_balance = Amount(await token_contract.functions.balanceOf(self.address).call(), wei=True)
-        if zero_balance.ether_float > zero_min_amount.ether_float:
+        zero_balance = await self.get_balance(Tokens.ZERO_ETH)
+        if zero_balance > zero_min_amount:
             logger.info(f"{self.profile_number}: Уже добавили ликивдность в Zerolend ранее")
             return
 
@@ -310,7 +308,7 @@ class Zeroland(Daps):
         :return: None
         """
         token_contract = self.get_contract(Tokens.ZERO_ETH)
-        value = Amount(await token_contract.functions.balanceOf(self.address).call(), wei=True)
+        value = await self.get_balance(Tokens.ZERO_ETH)
         if value.wei < 1e9:
             logger.warning(f"{self.profile_number}: Уже вывели ликвидность из Zerolend")
             return
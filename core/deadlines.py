@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Optional
+
+from loguru import logger
+
+from loader import config
+from utils import metrics
+
+_current: ContextVar[Optional[AccountDeadline]] = ContextVar('account_deadline', default=None)
+
+
+def report_progress() -> None:
+    """
+    Сообщает текущему этапу аккаунта, что работа движется, и продлевает его срок
+    :return: None
+    """
+    if (deadline := _current.get()) is not None:
+        deadline.progress()
+
+
+class AccountDeadline:
+    """
+    Сроки работы аккаунта по этапам. Срок этапа - p95 его успешных длительностей за запуск с запасом,
+    пока замеров мало - stage_default_budget. Завершение любого замеряемого шага внутри этапа
+    (запуск браузера, включение транзакции, ответ биржи) продлевает срок этапа, зависший этап
+    прерывается по своему сроку, а вся работа аккаунта ограничена account_timeout
+    """
+
+    def __init__(self, profile_number: int) -> None:
+        self.profile_number = profile_number
+        self.loop = asyncio.get_running_loop()
+        self.cap_at = self.loop.time() + config.account_timeout
+        self._timeout: Optional[asyncio.Timeout] = None
+        self._budget = 0.0
+        self._record = True
+
+    @staticmethod
+    def budget(stage: str) -> float:
+        """
+        Срок этапа по накопленным замерам
+        :param stage: название этапа
+        :return: секунды
+        """
+        samples = metrics.ok_samples.get(stage, [])
+        if len(samples) < config.stage_min_samples:
+            return config.stage_default_budget
+        return max(config.stage_min_budget, metrics.percentile(stage, 95, ok_only=True) * config.stage_budget_factor)
+
+    @asynccontextmanager
+    async def stage(self, name: str) -> AsyncIterator[None]:
+        """
+        Выполняет блок кода как этап со своим сроком, длительность этапа попадает в метрики
+        :param name: название этапа
+        :return: None
+        """
+        self._budget = self.budget(name)
+        self._record = True
+        token = _current.set(self)
+        started = time.perf_counter()
+        status = 'error'
+        timeout = asyncio.timeout(min(self.loop.time() + self._budget, self.cap_at))
+        try:
+            async with timeout:
+                self._timeout = timeout
+                yield
+            status = 'ok'
+        except TimeoutError:
+            if timeout.expired():
+                logger.error(f"{self.profile_number}: этап {name} не продвигался {self._budget:.0f} с, прерываем")
+            raise
+        finally:
+            self._timeout = None
+            _current.reset(token)
+            # этап без работы (квест уже засчитан) не попадает в замеры, иначе p95 этапа упадет до миллисекунд
+            if self._record or status != 'ok':
+                metrics.observe(name, self.profile_number, time.perf_counter() - started, status)
+
+    def skip_sample(self) -> None:
+        """
+        Отмечает, что текущий этап ничего не сделал и его длительность не нужно учитывать в сроках
+        :return: None
+        """
+        self._record = False
+
+    def progress(self) -> None:
+        if self._timeout is not None:
+            self._timeout.reschedule(min(self.loop.time() + self._budget, self.cap_at))
+
+
+def register_progress_listener() -> None:
+    """
+    Подписывает продление сроков этапов на успешные замеры шагов
+    :return: None
+    """
+    metrics.listeners.append(lambda stage, profile_number, seconds, status: report_progress() if status == 'ok' else None)
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import random
+
+from web3.types import TxParams, TxReceipt
+
+from loader import config
+
+
+class GasProfiles:
+    """
+    Кэш лимитов газа по форме вызова: адрес контракта + селектор функции.
+    Учится по квитанциям транзакций и отдает лимит из памяти вместо запроса estimate_gas
+    """
+
+    def __init__(self, min_samples: int = 1) -> None:
+        self.min_samples = min_samples
+        self._profiles: dict[tuple[str, str], tuple[int, int]] = {}
+
+    @staticmethod
+    def get_key(tx: TxParams) -> tuple[str, str]:
+        """
+        Формирует ключ формы вызова из параметров транзакции
+        :param tx: параметры транзакции
+        :return: адрес получателя в нижнем регистре и селектор функции
+        """
+        data = tx.get('data') or '0x'
+        if isinstance(data, bytes):
+            data = '0x' + data.hex()
+        return str(tx.get('to', '')).lower(), data[:10].lower()
+
+    def get(self, tx: TxParams) -> int:
+        """
+        Возвращает лимит газа из кэша с запасом и множителем gas_limit_multiple
+        :param tx: параметры транзакции
+        :return: лимит газа, либо 0 если профиль еще не собран
+        """
+        if not config.gas_cache:
+            return 0
+        max_gas_used, samples = self._profiles.get(self.get_key(tx), (0, 0))
+        if samples < self.min_samples:
+            return 0
+        return int(max_gas_used * config.gas_cache_margin * random.uniform(*config.gas_limit_multiple))
+
+    def learn(self, tx: TxParams, receipt: TxReceipt) -> None:
+        """
+        Запоминает фактически потраченный газ по успешной транзакции
+        :param tx: параметры транзакции
+        :param receipt: квитанция транзакции
+        :return: None
+        """
+        if receipt['status'] != 1:
+            return
+        key = self.get_key(tx)
+        max_gas_used, samples = self._profiles.get(key, (0, 0))
+        self._profiles[key] = max(max_gas_used, receipt['gasUsed']), samples + 1
+
+    def forget(self, tx: TxParams) -> None:
+        """
+        Удаляет профиль формы вызова, например если лимита из кэша не хватило
+        :param tx: параметры транзакции
+        :return: None
+        """
+        self._profiles.pop(self.get_key(tx), None)
+
+    @staticmethod
+    def is_out_of_gas(tx: TxParams, receipt: TxReceipt) -> bool:
+        """
+        Проверяет, что транзакция упала из-за нехватки газа
+        :param tx: параметры транзакции
+        :param receipt: квитанция транзакции
+        :return: True если транзакция откатилась, израсходовав почти весь лимит
+        """
+        return receipt['status'] == 0 and receipt['gasUsed'] >= tx['gas'] * 0.97
+
+
+gas_profiles = GasProfiles()
@@ -4,6 +4,7 @@ from typing import Literal
 from loguru import logger
 from okx import Funding
 
+from core.deadlines import report_progress
 from loader import config
 from models import Account
 
@@ -17,6 +18,7 @@ class OKX:
             config.okx.get("okx_secret_key"),
             config.okx.get("okx_passphrase"),
             flag="0",
+            domain=config.okx_domain,
             debug=False
         )
 
@@ -81,6 +83,7 @@ class OKX:
         for _ in range(30):
             tx_info = self.funding_api.get_deposit_withdraw_status(wdId=tx_id)
             if tx_info.get("code") == "0":
+                report_progress()
                 if 'Withdrawal complete' in tx_info.get("data")[0].get("state"):
                     logger.debug(f"{self.profile_number}: Транзакция {tx_id} завершена")
                     return
@@ -3,30 +3,39 @@ from __future__ import annotations
 import json
 import os
 import random
-from typing import Optional
+from types import MappingProxyType
+from typing import Mapping, Optional
 
 from loguru import logger
 from web3.contract import AsyncContract
 from web3.types import TxParams, TxReceipt, Wei
 
-from core.okx_client import OKX
-from loader import config, w3
-from models import ContractTemp, Account, Amount
-from utils import random_amount, random_sleep
+from core.context import AccountContext, ETH_BALANCE_KEY
+from core.gas import gas_profiles
+from core.transactions import TransactionReverted
+from loader import config
+from models import ContractTemp, TokenInfo, Amount
+from utils import random_amount, random_sleep, metrics
+
+APPROVE_SELECTOR = '0x095ea7b3'
 
 
 class Onchain:
     """
     Класс содержащий методы для работы с EVM блокчейном
     """
-    def __init__(self, account: Account):
-        self.profile_number = account.profile_number
-        self.private_key = account.private_key
-        self.withdraw_address = account.withdraw_address
-        self.w3 = w3
-        self.address = self.w3.eth.account.from_key(account.private_key).address
-        if config.is_withdraw_to_wallet:
-            self.okx = OKX(account)
+    def __init__(self, context: AccountContext):
+        """
+        :param context: общее состояние аккаунта, одно на все протоколы
+        """
+        self.ctx = context
+        self.profile_number = context.profile_number
+        self.private_key = context.private_key
+        self.withdraw_address = context.withdraw_address
+        self.proxy = context.proxy
+        self.w3 = context.w3
+        self.address = context.address
+        self.okx = context.okx
 
     async def get_balance(self, token: Optional[ContractTemp] = None) -> Amount:
         """
@@ -34,12 +43,23 @@ class Onchain:
         :param token: токен, если не указан, возвращает баланс ETH
         :return: баланс нативного токена или токена, если указан
         """
+        balances = self.ctx.balances
         if not token:
-            amount_wei = await self.w3.eth.get_balance(self.address)
-        else:
+            if (amount_wei := balances.get(ETH_BALANCE_KEY)) is None:
+                amount_wei = await self.w3.eth.get_balance(self.address)
+                balances.set(ETH_BALANCE_KEY, amount_wei)
+            return Amount(amount_wei, wei=True)
+
+        token_info = token_registry.get(token)
+        decimals = token_info.decimals if token_info else 18
+        cacheable = not (token_info and token_info.rebasing)
+        key = token.address.lower()
+        if not cacheable or (amount_wei := balances.get(key)) is None:
             contract = self.get_contract(token)
             amount_wei = await contract.functions.balanceOf(self.address).call()
-        return Amount(amount_wei, wei=True)
+            if cacheable:
+                balances.set(key, amount_wei)
+        return Amount(amount_wei, decimals=decimals, wei=True)
 
     def get_contract(self, contract: ContractTemp, abi_name: Optional[str] = None) -> AsyncContract:
         """
@@ -72,7 +92,6 @@ class Onchain:
             tx_params = TxParams()
 
         tx_params['from'] = self.address
-        tx_params['nonce'] = await self.w3.eth.get_transaction_count(self.address)
         tx_params['chainId'] = await self.w3.eth.chain_id
 
         if value:
@@ -99,23 +118,82 @@ class Onchain:
         max_priority_fee_per_gas = int(random.choice(non_empty_block_priority_fees) * fee_multiplier)
         return round(max_priority_fee_per_gas, -5)
 
-    async def send_transaction(self, tx: TxParams, gas: int = 0) -> TxReceipt:
+    async def send_transaction(self, tx: TxParams, gas: int = 0, use_gas_cache: bool = True) -> TxReceipt:
         """
-        Подписывает транзакцию приватным ключем и отправляет в сеть
+        Подписывает транзакцию приватным ключем и отправляет в сеть.
+        Лимит газа берется из кэша профилей газа, если форма вызова уже встречалась, тогда транзакция
+        перед отправкой проверяется через eth_call, чтобы не тратить газ на заведомо откатившуюся транзакцию.
+        Если лимита из кэша не хватило, транзакция повторяется с estimate_gas
         :param tx: параметры транзакции
         :param gas: лимит газа, если не указывать считается автоматически
+        :param use_gas_cache: брать лимит из кэша, False для вызовов, газ которых зависит от данных, например свап
         :return: хэш транзакции
         """
-        logger.debug(f"{self.profile_number}: запускаем отправку транзакции {tx}")
+        logger.bind(sampled=True).debug(
+            f"{self.profile_number}: запускаем отправку транзакции to={tx.get('to')} "
+            f"value={tx.get('value', 0)}")
+        gas_from_cache = False
         if gas:
             tx['gas'] = gas
+        elif use_gas_cache and (cached_gas := gas_profiles.get(tx)):
+            await self.simulate(tx)
+            tx['gas'] = cached_gas
+            gas_from_cache = True
         else:
-            tx['gas'] = int((await self.w3.eth.estimate_gas(tx)) * random.uniform(*config.gas_limit_multiple))
+            tx['gas'] = await self.estimate_gas(tx)
+
+        tx_receipt = await self._sign_and_send(tx)
+
+        if gas_from_cache and gas_profiles.is_out_of_gas(tx, tx_receipt):
+            logger.warning(f"{self.profile_number}: Не хватило газа из кэша, повторяем транзакцию с estimate_gas")
+            gas_profiles.forget(tx)
+            # nonce прошлой версии уже занят, новый выдаст TransactionLifecycle.send
+            tx.pop('nonce', None)
+            tx['gas'] = await self.estimate_gas(tx)
+            tx_receipt = await self._sign_and_send(tx)
+
+        if tx_receipt['status'] != 1:
+            raise TransactionReverted(
+                f"{self.profile_number}: транзакция {tx_receipt['transactionHash'].hex()} reverted")
+        if use_gas_cache:
+            gas_profiles.learn(tx, tx_receipt)
+        return tx_receipt
+
+    async def simulate(self, tx: TxParams) -> None:
+        """
+        Выполняет транзакцию через eth_call без отправки, при откате нода вернет ошибку
+        :param tx: параметры транзакции
+        :return: None
+        """
+        call = {key: value for key, value in tx.items() if key != 'nonce'}
+        await self.w3.eth.call(call)
 
-        signed_tx = self.w3.eth.account.sign_transaction(tx, self.private_key)
+    async def estimate_gas(self, tx: TxParams) -> int:
+        """
+        Запрашивает оценку газа у ноды и умножает на gas_limit_multiple
+        :param tx: параметры транзакции
+        :return: лимит газа
+        """
+        return int((await self.w3.eth.estimate_gas(tx)) * random.uniform(*config.gas_limit_multiple))
 
-        tx_hash = await self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-        return await self.w3.eth.wait_for_transaction_receipt(tx_hash)
+    async def _sign_and_send(self, tx: TxParams) -> TxReceipt:
+        """
+        Подписывает транзакцию, отправляет и ждет квитанцию, застрявшая транзакция ускоряется
+        :param tx: параметры транзакции с лимитом газа
+        :return: квитанция транзакции
+        """
+        try:
+            tx_receipt = await self.ctx.transactions.send(tx)
+        except Exception:
+            # транзакция могла не уйти в сеть, nonce перечитаем у ноды, балансы тоже
+            self.ctx.nonces.reset()
+            self.ctx.balances.clear()
+            raise
+        self.ctx.balances.apply_receipt(tx_receipt)
+        if tx.get('data', '0x')[:10] != APPROVE_SELECTOR:
+            # контракты тратят разрешения, известные суммы больше не актуальны
+            self.ctx.allowances.clear()
+        return tx_receipt
 
     async def approve(self, contract: AsyncContract, spender: ContractTemp, value: Amount) -> TxReceipt:
         """
@@ -125,11 +203,17 @@ class Onchain:
         :param value: сумма токенов
         :return: хэш транзакции
         """
-        allowance_amount = await contract.functions.allowance(self.address, spender.address).call()
+        key = (contract.address, spender.address)
+        allowance_amount = self.ctx.allowances.get(key)
+        if allowance_amount is None:
+            allowance_amount = await contract.functions.allowance(self.address, spender.address).call()
         if allowance_amount < value.wei:
             tx = await contract.functions.approve(spender.address, value.wei).build_transaction(
                 await self.prepare_transaction())
-            return await self.send_transaction(tx)
+            tx_receipt = await self.send_transaction(tx)
+            self.ctx.allowances[key] = value.wei
+            return tx_receipt
+        self.ctx.allowances[key] = allowance_amount
 
     async def withdraw_to_cex(self) -> None:
         """
@@ -148,16 +232,17 @@ class Onchain:
         balance = await self.get_balance()
         min_balance = random_amount(*config.min_balance)
 
-        if balance.ether_float <= config.min_balance[1]:
+        if balance <= config.min_balance[1]:
             logger.warning(f"{self.profile_number}: Баланс меньше минимального, оставляем на кошельке")
             return
 
-        amount = Amount(balance.ether_float - min_balance)
+        amount = balance - Amount(min_balance)
         tx_params = TxParams(
             to=withdraw_address,
         )
-        tx = await self.prepare_transaction(value=amount.wei, tx_params=tx_params)
-        tx_receipt = await self.send_transaction(tx)
+        with metrics.span('cex_withdraw', self.profile_number):
+            tx = await self.prepare_transaction(value=amount.wei, tx_params=tx_params)
+            tx_receipt = await self.send_transaction(tx)
         logger.info(f"{self.profile_number}: Вывод на CEX: {tx_receipt['transactionHash'].hex()}")
         await random_sleep(5, 10)
 
@@ -166,26 +251,52 @@ class Contracts:
     """
     Класс для хранения объектов контрактов
     """
-    wowmax_event_router = ContractTemp('0x9773e6C011e6CF919904b2F99DDc66e616611269')
-    nile_router = ContractTemp('0xaaa45c8f5ef92a000a121d102f4e89278a711faa', 'nile_router')
-    nile_pair = ContractTemp('0x0040F36784dDA0821E74BA67f86E084D70d67a3A', 'nile_pair')
-    nile_locker_lp = ContractTemp('0x8bb8b092f3f872a887f377f73719c665dd20ab06', 'nile_locker_lp')
-    zerolend = ContractTemp('0x5d50bE703836C330Fc2d147a631CDd7bb8D7171c', 'zerolend')
-    zerolend_pool = ContractTemp('0x2f9bB73a8e98793e26Cb2F6C4ad037BDf1C6B269')
+    wowmax_event_router = ContractTemp.get('0x9773e6C011e6CF919904b2F99DDc66e616611269')
+    nile_router = ContractTemp.get('0xaaa45c8f5ef92a000a121d102f4e89278a711faa', 'nile_router')
+    nile_pair = ContractTemp.get('0x0040F36784dDA0821E74BA67f86E084D70d67a3A', 'nile_pair')
+    nile_locker_lp = ContractTemp.get('0x8bb8b092f3f872a887f377f73719c665dd20ab06', 'nile_locker_lp')
+    zerolend = ContractTemp.get('0x5d50bE703836C330Fc2d147a631CDd7bb8D7171c', 'zerolend')
+    zerolend_pool = ContractTemp.get('0x2f9bB73a8e98793e26Cb2F6C4ad037BDf1C6B269')
+
+
+class TokenRegistry:
+    """
+    Реестр токенов, собирается один раз при импорте.
+    Поиск за O(1) по адресу или символу
+    """
+
+    def __init__(self, tokens: list[TokenInfo]) -> None:
+        by_symbol = {}
+        by_address = {}
+        for token in tokens:
+            by_symbol[token.symbol] = token
+            by_address[token.contract.address.lower()] = token
+        self.by_symbol: Mapping[str, TokenInfo] = MappingProxyType(by_symbol)
+        self.by_address: Mapping[str, TokenInfo] = MappingProxyType(by_address)
+
+    def get(self, token: ContractTemp | str) -> Optional[TokenInfo]:
+        """
+        Ищет токен по объекту контракта, адресу или символу
+        :param token: объект контракта, адрес или символ
+        :return: описание токена или None
+        """
+        if isinstance(token, ContractTemp):
+            token = token.address
+        return self.by_address.get(token.lower()) or self.by_symbol.get(token)
 
 
 class Tokens:
     """
     Класс для хранения объектов токенов
     """
-    ETH = ContractTemp('ETH')
-    WETH = ContractTemp('0x0000000000000000000000000000000000000000')
-    ZERO = ContractTemp('0x78354f8DcCB269a615A7e0a24f9B0718FDC3C7A7')
-    NILE = ContractTemp('0xAAAac83751090C6ea42379626435f805DDF54DC8')
-    LP_ZERO_WETH = ContractTemp('0x0040F36784dDA0821E74BA67f86E084D70d67a3A', 'nile_pair')
-    LP_NILE_WETH = ContractTemp('0xFC6A4cd4007C3d24D37114d81A801a56F9536625', 'nile_pair')
-    ZERO_ETH = ContractTemp('0xb4ffef15daf4c02787bc5332580b838ce39805f5')
-    ZERO_LP_VOTING = ContractTemp('0x0374ae8e866723ADAE4A62DcE376129F292369b4')
+    ETH = ContractTemp.get('ETH')
+    WETH = ContractTemp.get('0x0000000000000000000000000000000000000000')
+    ZERO = ContractTemp.get('0x78354f8DcCB269a615A7e0a24f9B0718FDC3C7A7')
+    NILE = ContractTemp.get('0xAAAac83751090C6ea42379626435f805DDF54DC8')
+    LP_ZERO_WETH = ContractTemp.get('0x0040F36784dDA0821E74BA67f86E084D70d67a3A', 'nile_pair')
+    LP_NILE_WETH = ContractTemp.get('0xFC6A4cd4007C3d24D37114d81A801a56F9536625', 'nile_pair')
+    ZERO_ETH = ContractTemp.get('0xb4ffef15daf4c02787bc5332580b838ce39805f5')
+    ZERO_LP_VOTING = ContractTemp.get('0x0374ae8e866723ADAE4A62DcE376129F292369b4')
 
     @classmethod
     def get_lp_token(cls, token: ContractTemp) -> ContractTemp:
@@ -194,9 +305,10 @@ class Tokens:
         :param token: токен
         :return: LP токен
         """
-        token_name = cls.get_token_name(token)
-        lp_token = getattr(cls, f'LP_{token_name}_WETH')
-        return lp_token
+        token_info = token_registry.get(token)
+        if token_info is None or token_info.lp_token is None:
+            raise ValueError(f"Нет LP пары с эфиром для токена {token}")
+        return token_info.lp_token
 
     @classmethod
     def get_token_name(cls, token: ContractTemp) -> str:
@@ -205,6 +317,34 @@ class Tokens:
         :param token:
         :return:
         """
-        for name, value in cls.__dict__.items():
-            if isinstance(value, ContractTemp) and value == token:
-                return name
+        token_info = token_registry.get(token)
+        if token_info is not None:
+            return token_info.symbol
+
+
+def build_token_registry() -> TokenRegistry:
+    """
+    Собирает реестр из известных токенов и дополнительных токенов из конфига
+    :return: реестр токенов
+    """
+    tokens = [
+        TokenInfo('ETH', Tokens.ETH),
+        TokenInfo('WETH', Tokens.WETH),
+        TokenInfo('ZERO', Tokens.ZERO, lp_token=Tokens.LP_ZERO_WETH),
+        TokenInfo('NILE', Tokens.NILE, lp_token=Tokens.LP_NILE_WETH),
+        TokenInfo('LP_ZERO_WETH', Tokens.LP_ZERO_WETH),
+        TokenInfo('LP_NILE_WETH', Tokens.LP_NILE_WETH),
+        TokenInfo('ZERO_ETH', Tokens.ZERO_ETH, rebasing=True),
+        TokenInfo('ZERO_LP_VOTING', Tokens.ZERO_LP_VOTING),
+    ]
+    for token in config.extra_tokens:
+        lp_token = None
+        if token.lp_address:
+            lp_token = ContractTemp.get(token.lp_address, 'nile_pair')
+            tokens.append(TokenInfo(f'LP_{token.symbol}_WETH', lp_token))
+        tokens.append(TokenInfo(token.symbol, ContractTemp.get(token.address, token.abi_name),
+                                token.decimals, lp_token, token.rebasing))
+    return TokenRegistry(tokens)
+
+
+token_registry = build_token_registry()
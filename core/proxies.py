@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from aiohttp import ClientTimeout
+from better_proxy import Proxy
+from loguru import logger
+
+from loader import config
+from utils import proxy_clients
+
+
+def proxy_key(proxy: Proxy) -> str:
+    """
+    Адрес точки подключения прокси, аккаунты с одинаковым адресом сидят на одном модеме
+    :param proxy: прокси
+    :return: host:port
+    """
+    return f'{proxy.host}:{proxy.port}'
+
+
+def interleave_by_proxy(profile_numbers: list[int], get_proxy: Callable[[int], Proxy]) -> list[int]:
+    """
+    Переставляет профили по кругу между прокси, чтобы соседние в очереди аккаунты были на разных модемах
+    и пауза после смены ip одного модема приходилась на работу аккаунтов других модемов
+    :param profile_numbers: номера профилей в исходном порядке
+    :param get_proxy: функция получения прокси профиля
+    :return: номера профилей в новом порядке
+    """
+    groups: OrderedDict[str, list[int]] = OrderedDict()
+    for profile_number in profile_numbers:
+        groups.setdefault(proxy_key(get_proxy(profile_number)), []).append(profile_number)
+
+    result = []
+    for position in range(max((len(group) for group in groups.values()), default=0)):
+        for group in groups.values():
+            if position < len(group):
+                result.append(group[position])
+    return result
+
+
+class ProxyRotator:
+    """
+    Смена ip мобильных прокси. Модем в каждый момент отдан одному аккаунту: аккаунт захватывает модем,
+    меняет ip, дожидается, пока новый ip начнет работать, и держит модем до конца своей работы,
+    поэтому смена ip не обрывает трафик другого аккаунта на том же модеме.
+    Модем захватывается до начала сроков этапов аккаунта, ожидание модема в сроки не входит,
+    а профили в очереди чередуются по модемам (interleave_by_proxy), чтобы воркеры были заняты аккаунтами других модемов
+    """
+
+    def __init__(self) -> None:
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._last_rotation: dict[str, float] = {}
+        self._held: dict[int, str] = {}
+
+    @staticmethod
+    def get_change_link(proxy: Proxy) -> str:
+        return config.change_ip_links.get(proxy_key(proxy), config.link_change_ip)
+
+    async def acquire(self, profile_number: int, proxy: Proxy) -> None:
+        """
+        Захватывает модем для профиля и меняет ip. Повторный вызов для того же профиля ничего не делает.
+        Если ip сменить не удалось, модем освобождается и ошибка пробрасывается, аккаунт не работает на старом ip
+        :param profile_number: номер профиля
+        :param proxy: прокси профиля
+        :return: None
+        """
+        if not config.is_mobile_proxy or profile_number in self._held:
+            return
+        key = proxy_key(proxy)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        await lock.acquire()
+        try:
+            await self._rotate(key, proxy)
+        except BaseException as error:
+            lock.release()
+            if isinstance(error, Exception):
+                logger.error(f"{profile_number}: Ошибка смены ip мобильного прокси {error}")
+            raise
+        self._held[profile_number] = key
+
+    def release(self, profile_number: int) -> None:
+        """
+        Освобождает модем профиля
+        :param profile_number: номер профиля
+        :return: None
+        """
+        if key := self._held.pop(profile_number, None):
+            self._locks[key].release()
+
+    async def _rotate(self, key: str, proxy: Proxy) -> None:
+        """
+        Меняет ip модема с соблюдением паузы между сменами и ждет, пока через прокси будет виден новый ip
+        :param key: адрес прокси
+        :param proxy: прокси
+        :return: None
+        """
+        wait = self._last_rotation.get(key, 0) + config.proxy_rotation_cooldown - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+        # ip до смены читаем заново, иначе при первой смене старый ip будет принят за новый
+        old_ip = await self.get_exit_ip(proxy)
+        try:
+            # ссылка смены ip обычно отвечает текстом, а не json
+            async with proxy_clients.session().get(self.get_change_link(proxy)) as response:
+                response.raise_for_status()
+        finally:
+            self._last_rotation[key] = time.monotonic()
+
+        deadline = time.monotonic() + config.proxy_rotation_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(2)
+            new_ip = await self.get_exit_ip(proxy)
+            if new_ip and new_ip != old_ip:
+                logger.debug(f"{key}: новый ip {new_ip}")
+                return
+        raise TimeoutError(f"{key}: новый ip не появился за {config.proxy_rotation_timeout} с")
+
+    @staticmethod
+    async def get_exit_ip(proxy: Proxy) -> Optional[str]:
+        """
+        Запрашивает внешний ip через прокси
+        :param proxy: прокси
+        :return: ip или None, если прокси еще не отвечает
+        """
+        try:
+            async with proxy_clients.session(proxy.as_url).get(
+                    config.ip_check_url, proxy=proxy.as_url, timeout=ClientTimeout(total=10)) as response:
+                return (await response.text()).strip()
+        except Exception:
+            return None
+
+
+proxy_rotator = ProxyRotator()
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from eth_account import Account as EthAccount
+from eth_account.datastructures import SignedTransaction
+from eth_account.signers.local import LocalAccount
+from web3.types import TxParams
+
+
+class Signer:
+    """
+    Сервис подписи: один LocalAccount на приватный ключ, вывод адреса делается один раз,
+    подпись транзакций идет в пуле потоков и не занимает событийный цикл.
+    Кэш хранит аккаунты по sha256 от ключа, сам ключ не используется как ключ словаря и не логируется
+    """
+
+    def __init__(self, max_accounts: int = 256, max_workers: int = 2) -> None:
+        self.max_accounts = max_accounts
+        self._accounts: OrderedDict[bytes, LocalAccount] = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='signer')
+
+    @staticmethod
+    def _digest(private_key: str) -> bytes:
+        return hashlib.sha256(private_key.lower().removeprefix('0x').encode()).digest()
+
+    def account(self, private_key: str) -> LocalAccount:
+        """
+        Возвращает LocalAccount ключа, создает его при первом обращении
+        :param private_key: приватный ключ
+        :return: LocalAccount
+        """
+        digest = self._digest(private_key)
+        if digest in self._accounts:
+            self._accounts.move_to_end(digest)
+            return self._accounts[digest]
+
+        account = EthAccount.from_key(private_key)
+        self._accounts[digest] = account
+        if len(self._accounts) > self.max_accounts:
+            self._accounts.popitem(last=False)
+        return account
+
+    def forget(self, private_key: str) -> None:
+        """
+        Убирает аккаунт ключа из кэша после завершения работы по профилю
+        :param private_key: приватный ключ
+        :return: None
+        """
+        self._accounts.pop(self._digest(private_key), None)
+
+    async def sign_transaction(self, private_key: str, tx: TxParams) -> SignedTransaction:
+        """
+        Подписывает транзакцию в пуле потоков
+        :param private_key: приватный ключ
+        :param tx: параметры транзакции
+        :return: подписанная транзакция
+        """
+        account = self.account(private_key)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, account.sign_transaction, dict(tx))
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+        self._accounts.clear()
+
+
+signer = Signer()
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Optional
+
+from eth_account.datastructures import SignedTransaction
+from hexbytes import HexBytes
+from loguru import logger
+from web3 import AsyncWeb3
+from web3.exceptions import TransactionNotFound
+from web3.types import TxParams, TxReceipt
+
+from core.deadlines import report_progress
+from loader import config
+from utils import metrics
+
+
+class TransactionTimeout(TimeoutError):
+    """
+    Транзакция не попала в блок за tx_timeout. Не повторяется: повтор шага отправит новые транзакции
+    """
+    error_kind = 'tx_timeout'
+
+
+class TransactionReverted(Exception):
+    """
+    Транзакция попала в блок, но откатилась. Не повторяется
+    """
+    error_kind = 'revert'
+
+
+class NonceManager:
+    """
+    Локальный счетчик nonce аккаунта: nonce запрашивается у ноды один раз и дальше увеличивается локально,
+    при ошибках отправки счетчик сбрасывается и перечитывается
+    """
+
+    def __init__(self, w3: AsyncWeb3, address: str) -> None:
+        self.w3 = w3
+        self.address = address
+        self._next: Optional[int] = None
+        self._lock = asyncio.Lock()
+
+    async def next(self) -> int:
+        """
+        Выдает nonce для новой транзакции
+        :return: nonce
+        """
+        async with self._lock:
+            if self._next is None:
+                self._next = await self.w3.eth.get_transaction_count(self.address, 'pending')
+            nonce = self._next
+            self._next += 1
+            return nonce
+
+    async def resync(self) -> int:
+        """
+        Перечитывает nonce у ноды и выдает его
+        :return: nonce
+        """
+        self.reset()
+        return await self.next()
+
+    def reset(self) -> None:
+        self._next = None
+
+
+class TransactionLifecycle:
+    """
+    Отправка транзакции с отслеживанием до включения в блок.
+    Если транзакция не попала в блок за tx_rebroadcast_blocks блоков, она переотправляется
+    с тем же nonce и поднятыми комиссиями, квитанция ищется по всем отправленным версиям
+    """
+
+    def __init__(self, w3: AsyncWeb3, profile_number: int,
+                 sign: Callable[[TxParams], Awaitable[SignedTransaction]], nonces: NonceManager) -> None:
+        self.w3 = w3
+        self.profile_number = profile_number
+        self.sign = sign
+        self.nonces = nonces
+
+    async def send(self, tx: TxParams) -> TxReceipt:
+        """
+        Подписывает и отправляет транзакцию, ускоряет ее при застревании и ждет квитанцию.
+        Nonce выдается здесь, прямо перед первой подписью, чтобы ошибка при подготовке транзакции не оставляла пропуск
+        :param tx: параметры транзакции с лимитом газа, без nonce
+        :return: квитанция транзакции
+        """
+        started = time.perf_counter()
+        tx['nonce'] = await self.nonces.next()
+        hashes: list[HexBytes] = []
+        await self._broadcast(tx, hashes)
+        sent_block = await self.w3.eth.block_number
+        deadline = time.monotonic() + config.tx_timeout
+
+        while time.monotonic() < deadline:
+            if receipt := await self._find_receipt(hashes):
+                metrics.observe('tx_inclusion', self.profile_number, time.perf_counter() - started)
+                return receipt
+
+            block = await self.w3.eth.block_number
+            if block - sent_block >= config.tx_rebroadcast_blocks and len(hashes) <= config.tx_max_replacements:
+                self._bump_fees(tx)
+                logger.warning(f"{self.profile_number}: транзакция nonce={tx['nonce']} не попала в блок за "
+                               f"{block - sent_block} блоков, переотправляем с комиссией {tx['maxPriorityFeePerGas']}")
+                await self._broadcast(tx, hashes)
+                sent_block = block
+            # транзакция отслеживается и ускоряется, этап не считается зависшим до tx_timeout
+            report_progress()
+            await asyncio.sleep(config.tx_poll_interval)
+
+        # застрявшая транзакция держит nonce, все следующие транзакции аккаунта встанут за ней,
+        # поэтому занимаем nonce пустым переводом себе с поднятой комиссией
+        if receipt := await self._cancel(tx, hashes):
+            metrics.observe('tx_inclusion', self.profile_number, time.perf_counter() - started)
+            return receipt
+        metrics.observe('tx_inclusion', self.profile_number, time.perf_counter() - started, 'error')
+        raise TransactionTimeout(f"{self.profile_number}: транзакция nonce={tx['nonce']} не попала в блок "
+                                 f"за {config.tx_timeout} с")
+
+    async def _cancel(self, tx: TxParams, hashes: list[HexBytes]) -> TxReceipt | None:
+        """
+        Заменяет застрявшую транзакцию переводом 0 ETH себе с тем же nonce и ждет, пока nonce будет занят
+        :param tx: параметры застрявшей транзакции
+        :param hashes: хэши отправленных версий, хэш отмены добавляется в конец
+        :return: квитанция исходной транзакции, если в блок успела попасть она, иначе None
+        """
+        cancel = TxParams(
+            {key: tx[key] for key in ('from', 'nonce', 'chainId', 'type', 'maxPriorityFeePerGas', 'maxFeePerGas')})
+        cancel.update(to=tx['from'], value=0, gas=21000)
+        self._bump_fees(cancel)
+        originals = len(hashes)
+        try:
+            await self._broadcast(cancel, hashes)
+        except Exception as error:
+            logger.error(f"{self.profile_number}: не удалось отменить транзакцию nonce={tx['nonce']} {error}")
+            return None
+        logger.warning(f"{self.profile_number}: транзакция nonce={tx['nonce']} не попала в блок "
+                       f"за {config.tx_timeout} с, отменяем")
+
+        deadline = time.monotonic() + config.tx_cancel_timeout
+        while time.monotonic() < deadline:
+            for index, tx_hash in enumerate(hashes):
+                try:
+                    receipt = await self.w3.eth.get_transaction_receipt(tx_hash)
+                except TransactionNotFound:
+                    continue
+                return receipt if index < originals else None
+            report_progress()
+            await asyncio.sleep(config.tx_poll_interval)
+        logger.error(f"{self.profile_number}: отмена транзакции nonce={tx['nonce']} не попала в блок")
+        return None
+
+    async def _broadcast(self, tx: TxParams, hashes: list[HexBytes]) -> None:
+        """
+        Подписывает и отправляет версию транзакции, обрабатывая ответы ноды о замене и nonce
+        :param tx: параметры транзакции
+        :param hashes: хэши уже отправленных версий, новый хэш добавляется в конец
+        :return: None
+        """
+        for _ in range(config.tx_max_replacements + 1):
+            signed_tx = await self.sign(tx)
+            try:
+                tx_hash = await self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+            except Exception as error:
+                message = str(error).lower()
+                if 'already known' in message:
+                    # такая же транзакция уже в мемпуле, ждем ее
+                    tx_hash = signed_tx.hash
+                elif 'underpriced' in message:
+                    self._bump_fees(tx)
+                    continue
+                elif 'nonce too low' in message:
+                    if hashes:
+                        # в блок попала одна из прошлых версий, квитанцию найдет ожидание
+                        return
+                    tx['nonce'] = await self.nonces.resync()
+                    continue
+                else:
+                    raise
+            hashes.append(HexBytes(tx_hash))
+            return
+        raise Exception(f"{self.profile_number}: не удалось отправить транзакцию nonce={tx['nonce']}")
+
+    async def _find_receipt(self, hashes: list[HexBytes]) -> TxReceipt | None:
+        """
+        Ищет квитанцию любой из отправленных версий, начиная с последней
+        :param hashes: хэши версий транзакции
+        :return: квитанция или None
+        """
+        for tx_hash in reversed(hashes):
+            try:
+                return await self.w3.eth.get_transaction_receipt(tx_hash)
+            except TransactionNotFound:
+                continue
+        return None
+
+    @staticmethod
+    def _bump_fees(tx: TxParams) -> None:
+        """
+        Поднимает комиссии транзакции, нода принимает замену только если обе комиссии выросли не меньше чем на 10%
+        :param tx: параметры транзакции
+        :return: None
+        """
+        tx['maxPriorityFeePerGas'] = int(tx['maxPriorityFeePerGas'] * config.tx_fee_bump) + 1
+        tx['maxFeePerGas'] = max(int(tx['maxFeePerGas'] * config.tx_fee_bump) + 1, tx['maxPriorityFeePerGas'])
@@ -1,2 +1,3 @@
 from .models.accounts import Accounts
-from .settings import initialize_database, close_database
\ No newline at end of file
+from .settings import initialize_database, close_database
+from .leases import LeaseManager, WORKER_ID
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import socket
+from typing import Optional
+
+from loguru import logger
+
+from database.models.accounts import Accounts
+
+# идентификатор процесса для захвата аккаунтов в общей бд
+WORKER_ID = f'{socket.gethostname()}-{os.getpid()}'
+
+
+class LeaseManager:
+    """
+    Захват аккаунтов процессом в общей бд.
+    Пока процесс жив, фоновая задача продлевает захват всех его аккаунтов раз в треть срока,
+    захваты упавшего процесса истекают и аккаунты забирают другие процессы
+    """
+
+    def __init__(self, owner: str = WORKER_ID, ttl: int = 120) -> None:
+        self.owner = owner
+        self.ttl = ttl
+        self.held: set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """
+        Запускает фоновое продление захватов
+        :return: None
+        """
+        self._task = asyncio.create_task(self._heartbeat())
+
+    async def stop(self) -> None:
+        """
+        Останавливает продление и освобождает все аккаунты процесса
+        :return: None
+        """
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self.held:
+            await Accounts.release(list(self.held), self.owner)
+            self.held.clear()
+
+    async def claim_batch(self, profile_numbers: list[int]) -> list[int]:
+        """
+        Захватывает пачку аккаунтов, порядок профилей сохраняется
+        :param profile_numbers: номера профилей
+        :return: номера захваченных профилей
+        """
+        claimed = set(await Accounts.claim_batch(profile_numbers, self.owner, self.ttl))
+        self.held |= claimed
+        return [profile_number for profile_number in profile_numbers if profile_number in claimed]
+
+    async def release(self, profile_number: int) -> None:
+        """
+        Освобождает аккаунт после завершения работы по нему
+        :param profile_number: номер профиля
+        :return: None
+        """
+        self.held.discard(profile_number)
+        await Accounts.release([profile_number], self.owner)
+
+    def is_held(self, profile_number: int) -> bool:
+        return profile_number in self.held
+
+    async def renew(self) -> None:
+        """
+        Продлевает захват всех аккаунтов процесса, потерянные захваты убирает из списка
+        :return: None
+        """
+        if not self.held:
+            return
+        held = list(self.held)
+        renewed = set(await Accounts.renew(held, self.owner, self.ttl))
+        for profile_number in held:
+            if profile_number not in renewed and profile_number in self.held:
+                logger.warning(f"{profile_number}: захват аккаунта потерян, его мог забрать другой процесс")
+                self.held.discard(profile_number)
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                await self.renew()
+            except Exception as error:
+                logger.error(f"Ошибка продления захвата аккаунтов: {error}")
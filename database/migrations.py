@@ -0,0 +1,52 @@
+from tortoise import Tortoise
+from tortoise.backends.base.client import BaseDBAsyncClient
+from loguru import logger
+
+# колонки, добавленные после первой версии схемы: таблица - колонка - тип по диалекту.
+# generate_schemas не меняет существующие таблицы, поэтому старые базы догоняются через ALTER TABLE
+COLUMNS: dict[str, dict[str, dict[str, str]]] = {
+    'accounts': {
+        'lease_owner': {'sqlite': 'VARCHAR(255)', 'postgres': 'VARCHAR(255)'},
+        'leased_at': {'sqlite': 'TIMESTAMP', 'postgres': 'TIMESTAMPTZ'},
+        'lease_expires_at': {'sqlite': 'TIMESTAMP', 'postgres': 'TIMESTAMPTZ'},
+        'heartbeat_at': {'sqlite': 'TIMESTAMP', 'postgres': 'TIMESTAMPTZ'},
+    },
+}
+
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_accounts_profile_number ON accounts (profile_number)',
+    'CREATE INDEX IF NOT EXISTS idx_accounts_lease_owner ON accounts (lease_owner)',
+]
+
+
+async def get_columns(connection: BaseDBAsyncClient, table: str) -> set[str]:
+    """
+    Возвращает имена колонок таблицы
+    :param connection: соединение с бд
+    :param table: имя таблицы
+    :return: множество имен колонок
+    """
+    if connection.capabilities.dialect == 'sqlite':
+        rows = await connection.execute_query_dict(f'PRAGMA table_info({table})')
+        return {row['name'] for row in rows}
+    rows = await connection.execute_query_dict(
+        'SELECT column_name FROM information_schema.columns WHERE table_name = $1', [table])
+    return {row['column_name'] for row in rows}
+
+
+async def migrate() -> None:
+    """
+    Добавляет недостающие колонки и индексы в существующие таблицы
+    :return: None
+    """
+    connection = Tortoise.get_connection('default')
+    dialect = connection.capabilities.dialect
+    for table, columns in COLUMNS.items():
+        existing = await get_columns(connection, table)
+        for column, types in columns.items():
+            if column not in existing:
+                await connection.execute_script(f'ALTER TABLE {table} ADD COLUMN {column} {types[dialect]} NULL')
+                logger.info(f'В таблицу {table} добавлена колонка {column}')
+
+    for index in INDEXES:
+        await connection.execute_script(index)
@@ -1,4 +1,14 @@
-from tortoise import Model, fields
+from datetime import timedelta
+
+from tortoise import Model, fields, timezone
+from tortoise.expressions import Q
+from tortoise.transactions import in_transaction
+
+from database.writer import status_writer
+
+# адрес-заглушка для записей, созданных до первого запуска профиля, уникален по номеру профиля,
+# чтобы сервера на общей бд не создавали дубли. Настоящий адрес записывается в create_account
+SEED_ADDRESS_PREFIX = 'profile:'
 
 
 class Accounts(Model):
@@ -8,6 +18,10 @@ class Accounts(Model):
     quest_2_status = fields.BooleanField(default=False)
     quest_3_status = fields.BooleanField(default=False)
     quest_4_status = fields.BooleanField(default=False)
+    lease_owner = fields.CharField(max_length=255, null=True)
+    leased_at = fields.DatetimeField(null=True)
+    lease_expires_at = fields.DatetimeField(null=True)
+    heartbeat_at = fields.DatetimeField(null=True)
 
     class Meta:
         table = "accounts"
@@ -40,26 +54,114 @@ class Accounts(Model):
         account = await cls.get_account(profile_number=profile_number)
         if account is None:
             await cls.create(profile_number=profile_number, address=address, )
+        elif account.address != address:
+            await cls.filter(profile_number=profile_number).update(address=address)
+
+    @classmethod
+    async def get_profile_numbers(cls) -> set[int]:
+        """
+        Возвращает номера профилей, для которых уже есть запись в бд
+        :return: множество номеров профилей
+        """
+        return set(await cls.all().values_list('profile_number', flat=True))
+
+    @classmethod
+    async def seed(cls, profile_numbers: list[int]) -> None:
+        """
+        Создает записи аккаунтов пачками, записи, уже созданные другим сервером, пропускаются.
+        Ключи не расшифровываются, адрес заполняется при запуске профиля
+        :param profile_numbers: номера профилей
+        :return:  None
+        """
+        await cls.bulk_create(
+            [cls(profile_number=profile_number, address=f'{SEED_ADDRESS_PREFIX}{profile_number}')
+             for profile_number in profile_numbers],
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+
+    @classmethod
+    async def claim_batch(cls, profile_numbers: list[int], owner: str, ttl: int) -> list[int]:
+        """
+        Захватывает пачку невыполненных аккаунтов для работы. Строки блокируются через SELECT ... FOR UPDATE
+        SKIP LOCKED, поэтому несколько процессов на общей бд не возьмут один аккаунт, а заблокированные строки
+        пропускаются. Свободными считаются аккаунты без владельца или с истекшим захватом
+        :param profile_numbers:  номера профилей
+        :param owner:  идентификатор процесса
+        :param ttl:  срок захвата в секундах
+        :return:  номера захваченных профилей
+        """
+        now = timezone.now()
+        free = Q(lease_owner=None) | Q(lease_expires_at=None) | Q(lease_expires_at__lt=now)
+        incomplete = Q(quest_1_status=False, quest_2_status=False, quest_3_status=False, quest_4_status=False,
+                       join_type='OR')
+        async with in_transaction() as connection:
+            ids = await cls.filter(free, incomplete, profile_number__in=profile_numbers).select_for_update(
+                skip_locked=True).using_db(connection).values_list('id', flat=True)
+            if not ids:
+                return []
+            # SQLite не поддерживает FOR UPDATE, условный UPDATE защищает от гонки между процессами
+            await cls.filter(free, id__in=ids).using_db(connection).update(
+                lease_owner=owner, leased_at=now, lease_expires_at=now + timedelta(seconds=ttl), heartbeat_at=now)
+            return await cls.filter(id__in=ids, lease_owner=owner).using_db(connection).values_list(
+                'profile_number', flat=True)
+
+    @classmethod
+    async def renew(cls, profile_numbers: list[int], owner: str, ttl: int) -> list[int]:
+        """
+        Продлевает захват аккаунтов
+        :param profile_numbers:  номера профилей
+        :param owner:  идентификатор процесса
+        :param ttl:  срок захвата в секундах
+        :return:  номера профилей, захват которых удалось продлить
+        """
+        now = timezone.now()
+        async with in_transaction() as connection:
+            query = cls.filter(profile_number__in=profile_numbers, lease_owner=owner).using_db(connection)
+            await query.update(lease_expires_at=now + timedelta(seconds=ttl), heartbeat_at=now)
+            return await query.values_list('profile_number', flat=True)
+
+    @classmethod
+    async def release(cls, profile_numbers: list[int], owner: str) -> None:
+        """
+        Освобождает захваченные аккаунты
+        :param profile_numbers:  номера профилей
+        :param owner:  идентификатор процесса
+        :return:  None
+        """
+        await cls.filter(profile_number__in=profile_numbers, lease_owner=owner).update(
+            lease_owner=None, leased_at=None, lease_expires_at=None, heartbeat_at=None)
 
     @classmethod
     async def change_status(cls, profile_number: int, quest: int) -> None:
         """
-        Изменяет статус квеста по номеру профиля и номеру квеста
+        Изменяет статус квеста по номеру профиля и номеру квеста.
+        Если запущен писатель статусов, запись идет пачкой через него
         :param profile_number:  номер профиля
         :param quest:  номер квеста
         :return:  None
         """
-        account = await cls.get_account(profile_number=profile_number)
-        if account is not None:
-            if quest == 1:
-                account.quest_1_status = True
-            elif quest == 2:
-                account.quest_2_status = True
-            elif quest == 3:
-                account.quest_3_status = True
-            elif quest == 4:
-                account.quest_4_status = True
-            await account.save()
+        if status_writer.is_running:
+            await status_writer.write(profile_number, quest)
+        else:
+            await cls.set_statuses([(profile_number, quest)])
+
+    @classmethod
+    async def set_statuses(cls, statuses: list[tuple[int, int]]) -> None:
+        """
+        Записывает пачку статусов квестов одной транзакцией, по одному UPDATE на профиль
+        :param statuses: список пар номер профиля - номер квеста
+        :return:  None
+        """
+        quests_by_profile: dict[int, set[int]] = {}
+        for profile_number, quest in statuses:
+            if quest in (1, 2, 3, 4):
+                quests_by_profile.setdefault(profile_number, set()).add(quest)
+
+        async with in_transaction():
+            for profile_number, quests in quests_by_profile.items():
+                await cls.filter(profile_number=profile_number).update(
+                    **{f'quest_{quest}_status': True for quest in quests})
 
     @classmethod
     async def get_status(cls, profile_number: int, quest: int) -> bool:
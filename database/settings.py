@@ -1,6 +1,35 @@
 from tortoise import Tortoise
 from loguru import logger
 
+from database.migrations import migrate
+from database.models.accounts import Accounts
+from database.writer import status_writer
+from loader import config
+
+
+def get_db_url() -> str:
+    """
+    Формирует url базы. Если в конфиге задан db_url (например PostgreSQL для нескольких серверов),
+    к нему добавляется размер пула соединений, иначе используется локальный файл SQLite.
+    Для SQLite: WAL позволяет читать во время записи, busy_timeout ждет освобождения блокировки вместо ошибки
+    database is locked, synchronous=NORMAL в режиме WAL не теряет целостность и быстрее FULL
+    :return: url базы
+    """
+    if config.db_url:
+        if config.db_url.startswith(('postgres://', 'asyncpg://')) and 'maxsize=' not in config.db_url:
+            separator = '&' if '?' in config.db_url else '?'
+            return f'{config.db_url}{separator}minsize=1&maxsize={config.db_pool_size}'
+        return config.db_url
+
+    pragmas = {
+        'journal_mode': 'WAL',
+        'synchronous': config.db_synchronous,
+        'busy_timeout': config.db_busy_timeout,
+        'journal_size_limit': 16384,
+    }
+    return 'sqlite://database/database.sqlite3?' + '&'.join(f'{key}={value}' for key, value in pragmas.items())
+
+
 async def initialize_database() -> None:
     """
     Инициализация базы данных
@@ -8,10 +37,12 @@ async def initialize_database() -> None:
     """
     try:
         await Tortoise.init(
-            db_url='sqlite://database/database.sqlite3',
+            db_url=get_db_url(),
             modules={'models': ['database.models.accounts']},
         )
         await Tortoise.generate_schemas(safe=True)
+        await migrate()
+        status_writer.start(Accounts.set_statuses)
 
     except Exception as error:
         logger.error(f'Ошибка инициализации бд: {error}')
@@ -23,7 +54,8 @@ async def close_database() -> None:
     :return:
     """
     try:
+        await status_writer.stop()
         await Tortoise.close_connections()
         logger.info('Соединение с бд закрыто.')
     except Exception as error:
-        logger.error(f'Ошибка при попытке закрыть подключение к бд: {error}')
\ No newline at end of file
+        logger.error(f'Ошибка при попытке закрыть подключение к бд: {error}')
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+from loguru import logger
+
+Status = tuple[int, int]
+
+
+class StatusWriter:
+    """
+    Единственная задача-писатель статусов квестов.
+    Воркеры кладут статус в очередь и ждут подтверждения, а писатель собирает
+    все накопившиеся статусы и записывает их одной транзакцией
+    """
+
+    def __init__(self, max_batch: int = 100) -> None:
+        self.max_batch = max_batch
+        self._queue: asyncio.Queue[Optional[tuple[Status, asyncio.Future]]] = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self._apply: Optional[Callable[[list[Status]], Awaitable[None]]] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, apply: Callable[[list[Status]], Awaitable[None]]) -> None:
+        """
+        Запускает задачу-писатель
+        :param apply: функция записи пачки статусов одной транзакцией
+        :return: None
+        """
+        self._apply = apply
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Дописывает очередь и останавливает задачу-писатель
+        :return: None
+        """
+        if not self.is_running:
+            return
+        await self._queue.put(None)
+        await self._task
+
+    async def write(self, profile_number: int, quest: int) -> None:
+        """
+        Ставит статус в очередь на запись и ждет, пока пачка с ним будет записана
+        :param profile_number: номер профиля
+        :param quest: номер квеста
+        :return: None
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(((profile_number, quest), future))
+        await future
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch = [await self._queue.get()]
+            while not self._queue.empty() and len(batch) < self.max_batch:
+                batch.append(self._queue.get_nowait())
+            if None in batch:
+                stopping = True
+                batch = [item for item in batch if item is not None]
+            if not batch:
+                continue
+
+            try:
+                await self._apply([status for status, _ in batch])
+            except Exception as error:
+                logger.error(f"Ошибка записи статусов в бд: {error}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            for _, future in batch:
+                # воркер мог быть отменен по таймауту, пока ждал записи
+                if not future.done():
+                    future.set_result(None)
+
+
+status_writer = StatusWriter()
@@ -16,8 +16,9 @@ class ConfigSingleton(metaclass=SingletonMeta):
     """Создание конфига в одном экземпляре"""
 
     def __init__(self):
-        from utils import load_config, create_w3
+        from utils import load_config, create_w3, create_account_source
         self.config = load_config()
+        self.accounts = create_account_source(self.config.accounts_store)
         self.w3 = create_w3(self.config.rpc_linea)
         self.semaphore = asyncio.Semaphore(self.config.threads)
         self.lock = asyncio.Lock()
@@ -25,5 +26,6 @@ class ConfigSingleton(metaclass=SingletonMeta):
 
 config = ConfigSingleton().config
 w3 = ConfigSingleton().w3
+accounts = ConfigSingleton().accounts
 semaphore = asyncio.Semaphore(config.threads)
 lock = asyncio.Lock()
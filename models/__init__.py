@@ -1,5 +1,5 @@
 from .account import Account
 from .config import Config
-from .contract import ContractTemp
+from .contract import ContractTemp, TokenInfo
 from .quest import Quest
 from .amount import Amount
\ No newline at end of file
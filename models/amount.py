@@ -1,34 +1,163 @@
 from __future__ import annotations
 
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
+from typing import Optional
 
 from web3.types import Wei
 
 
 class Amount:
     """
-    Класс для работы с суммами в ETH и WEI
+    Класс для работы с суммами в ETH и WEI.
+    Хранит целое число wei, представления в Decimal и float считаются лениво,
+    арифметика и сравнения идут в целых числах без округлений через float
     """
+    __slots__ = ('wei', 'decimals', '_ether')
+
     wei: Wei | int
-    ether: Decimal
-    ether_float: float
     decimals: int
 
     def __init__(self, amount: int | float | str | Decimal, decimals: int = 18, wei: bool = False) -> None:
 
         if wei:
             self.wei = int(amount)
-            self.ether = Decimal(str(amount)) / 10 ** decimals
-            self.ether_float = float(self.ether)
+        elif isinstance(amount, int):
+            self.wei = amount * 10 ** decimals
         else:
-            self.wei = int(amount * 10 ** decimals)
-            self.ether = Decimal(str(amount))
-            self.ether_float = float(amount)
+            # str(float) дает кратчайшее точное представление, без хвостов двоичной дроби
+            self.wei = int(self._to_decimal(amount).scaleb(decimals))
 
         self.decimals = decimals
+        self._ether: Optional[Decimal] = None
+
+    @property
+    def ether(self) -> Decimal:
+        """
+        Сумма в целых единицах токена
+        :return: Decimal
+        """
+        if self._ether is None:
+            self._ether = Decimal(self.wei).scaleb(-self.decimals)
+        return self._ether
+
+    @property
+    def ether_float(self) -> float:
+        """
+        Сумма в целых единицах токена, float
+        :return: float
+        """
+        return self.wei / 10 ** self.decimals
+
+    @staticmethod
+    def _to_decimal(value: int | float | str | Decimal) -> Decimal:
+        return value if isinstance(value, Decimal) else Decimal(str(value))
+
+    def _from_wei(self, wei: int) -> Amount:
+        return Amount(wei, self.decimals, wei=True)
+
+    def _check_decimals(self, other: Amount) -> None:
+        if self.decimals != other.decimals:
+            raise ValueError(f"Разные decimals у сумм: {self.decimals} и {other.decimals}")
+
+    def mul_div(self, numerator: int, denominator: int) -> Amount:
+        """
+        Умножает и делит сумму в целых числах, например для процентов или пропорций резервов пула
+        :param numerator: числитель
+        :param denominator: знаменатель
+        :return: новая сумма, округленная вниз
+        """
+        return self._from_wei(self.wei * int(numerator) // int(denominator))
+
+    def __add__(self, other: Amount) -> Amount:
+        if not isinstance(other, Amount):
+            return NotImplemented
+        self._check_decimals(other)
+        return self._from_wei(self.wei + other.wei)
+
+    def __sub__(self, other: Amount) -> Amount:
+        if not isinstance(other, Amount):
+            return NotImplemented
+        self._check_decimals(other)
+        return self._from_wei(self.wei - other.wei)
+
+    def __mul__(self, other: int | float | str | Decimal) -> Amount:
+        if isinstance(other, Amount):
+            return NotImplemented
+        if isinstance(other, int):
+            return self._from_wei(self.wei * other)
+        return self._from_wei(int(self.wei * self._to_decimal(other)))
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other: Amount | int | float | str | Decimal) -> Amount | Decimal:
+        """
+        Деление на сумму возвращает отношение в Decimal (цену), деление на число - новую сумму
+        """
+        if isinstance(other, Amount):
+            return Decimal(self.wei * 10 ** other.decimals) / Decimal(other.wei * 10 ** self.decimals)
+        if isinstance(other, int):
+            return self._from_wei(self.wei // other)
+        return self._from_wei(int(self.wei / self._to_decimal(other)))
+
+    def _compare_key(self, other: object) -> Optional[tuple[int | Decimal, int | Decimal]]:
+        """
+        Приводит обе суммы к общему масштабу для точного сравнения
+        :param other: сумма или число в целых единицах токена
+        :return: пара значений для сравнения, None если other не число
+        """
+        if isinstance(other, Amount):
+            if self.decimals == other.decimals:
+                return self.wei, other.wei
+            return self.wei * 10 ** other.decimals, other.wei * 10 ** self.decimals
+        if not isinstance(other, (int, float, str, Decimal)):
+            return None
+        try:
+            value = self._to_decimal(other)
+        except InvalidOperation:
+            return None
+        if value.is_nan():
+            return None
+        return Decimal(self.wei), value.scaleb(self.decimals)
+
+    def __eq__(self, other: object) -> bool:
+        if (key := self._compare_key(other)) is None:
+            return NotImplemented
+        left, right = key
+        return left == right
+
+    def __lt__(self, other: Amount | int | float | Decimal) -> bool:
+        if (key := self._compare_key(other)) is None:
+            return NotImplemented
+        left, right = key
+        return left < right
+
+    def __le__(self, other: Amount | int | float | Decimal) -> bool:
+        if (key := self._compare_key(other)) is None:
+            return NotImplemented
+        left, right = key
+        return left <= right
+
+    def __gt__(self, other: Amount | int | float | Decimal) -> bool:
+        if (key := self._compare_key(other)) is None:
+            return NotImplemented
+        left, right = key
+        return left > right
+
+    def __ge__(self, other: Amount | int | float | Decimal) -> bool:
+        if (key := self._compare_key(other)) is None:
+            return NotImplemented
+        left, right = key
+        return left >= right
+
+    def __hash__(self) -> int:
+        # хэш от значения в целых единицах, равные суммы с разными decimals и равные им числа совпадают
+        return hash(self.ether)
+
+    def __bool__(self) -> bool:
+        return self.wei != 0
 
     def __str__(self) -> str:
-        return str(self.ether)
+        return format(self.ether.normalize(), 'f')
 
     def __repr__(self) -> str:
-        return f"Amount(ether={self.ether_float}, wei={self.wei}, decimals={self.decimals})"
\ No newline at end of file
+        return f"Amount(ether={self.ether_float}, wei={self.wei}, decimals={self.decimals})"
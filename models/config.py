@@ -1,13 +1,24 @@
+from typing import Optional
+
 from pydantic import BaseModel
 
-from models import Account
+
+class TokenConfig(BaseModel):
+    """
+    Дополнительный токен и его LP пара с эфиром из settings.yaml
+    """
+    symbol: str
+    address: str
+    decimals: int = 18
+    abi_name: str = 'token'
+    lp_address: Optional[str] = None
+    rebasing: bool = False
 
 
 class Config(BaseModel):
     """
     Конфигурация бота c валидацией
     """
-    accounts: list[Account]
     threads: int
     is_withdraw_to_wallet: bool
     okx: dict[str, str]
@@ -15,12 +26,56 @@ class Config(BaseModel):
     metamask_url: str
     gas_multiple: list[float, float]
     gas_limit_multiple: list[float, float]
+    gas_cache: bool = True
+    gas_cache_margin: float = 1.1
+    tx_rebroadcast_blocks: int = 5
+    tx_fee_bump: float = 1.15
+    tx_max_replacements: int = 5
+    tx_poll_interval: float = 2.0
+    tx_timeout: int = 300
+    tx_cancel_timeout: int = 120
     shuffle_profiles: bool
     eth_price: float = 0.0
     use_proxy: bool
     is_mobile_proxy: bool
     link_change_ip: str
+    change_ip_links: dict[str, str] = {}
+    proxy_rotation_cooldown: int = 10
+    proxy_rotation_timeout: int = 60
+    ip_check_url: str = 'https://api.ipify.org'
+    proxy_api_traffic: bool = True
+    proxy_max_latency: float = 5.0
+    proxy_max_failure_rate: float = 0.5
     is_withdraw_to_cex: bool
     min_balance: list[float, float]
     tg_token: str
     tg_chat_id: str
+    tg_digest_interval: int = 60
+    loop_monitor: bool = False
+    loop_lag_threshold: float = 0.1
+    metrics_port: int = 0
+    ads_api_url: str = 'http://local.adspower.net:50325/api/v1/'
+    wowmax_api_url: str = 'https://api-gateway.wowmax.exchange'
+    intract_quest_url: str = 'https://www.intract.io/quest/66bb5618c8ff56cba848ea8f'
+    okx_domain: str = 'https://www.okx.com'
+    extra_tokens: list[TokenConfig] = []
+    accounts_store: str = ''
+    watch_new_accounts: bool = False
+    watch_interval: int = 60
+    log_debug_sample_rate: int = 10
+    db_synchronous: str = 'NORMAL'
+    db_busy_timeout: int = 5000
+    db_url: str = ''
+    db_pool_size: int = 10
+    lease_ttl: int = 120
+    warm_pool_size: int = 0
+    browser_ram_mb: int = 700
+    ram_reserve_mb: int = 2048
+    light_pages: bool = True
+    account_timeout: int = 1800
+    stage_default_budget: int = 600
+    stage_min_budget: int = 60
+    stage_budget_factor: float = 1.5
+    stage_min_samples: int = 5
+    circuit_threshold: int = 5
+    circuit_cooldown: int = 60
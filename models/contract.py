@@ -1,11 +1,23 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from functools import lru_cache
+from typing import ClassVar, Optional
 
 from eth_typing import ChecksumAddress
 from web3 import Web3
 
 
+@lru_cache(maxsize=None)
+def to_checksum_address(address: str) -> ChecksumAddress:
+    """
+    Переводит адрес в checksum формат с кэшированием, keccak считается один раз на адрес
+    :param address: адрес
+    :return: checksum адрес
+    """
+    return Web3.to_checksum_address(address)
+
+
 @dataclass
 class ContractTemp:
     """
@@ -14,10 +26,26 @@ class ContractTemp:
     address: ChecksumAddress | str
     abi_name: str = 'token'
 
+    _instances: ClassVar[dict[tuple[str, str], ContractTemp]] = {}
+
     def __post_init__(self) -> None:
         if isinstance(self.address, str):
             if not 'ETH' in self.address:
-                self.address = Web3.to_checksum_address(self.address)
+                self.address = to_checksum_address(self.address)
+
+    @classmethod
+    def get(cls, address: str, abi_name: str = 'token') -> ContractTemp:
+        """
+        Возвращает общий экземпляр контракта для адреса и аби, создает его только при первом обращении
+        :param address: адрес контракта
+        :param abi_name: имя файла аби
+        :return: объект контракта
+        """
+        key = (address.lower(), abi_name)
+        contract = cls._instances.get(key)
+        if contract is None:
+            contract = cls._instances[key] = cls(address, abi_name)
+        return contract
 
     def __str__(self) -> ChecksumAddress:
         return self.address
@@ -29,3 +57,14 @@ class ContractTemp:
         return hash(self.address)
 
 
+@dataclass(frozen=True)
+class TokenInfo:
+    """
+    Описание токена в реестре: символ, контракт, decimals и LP токен пары с эфиром.
+    rebasing - баланс меняется без событий Transfer (например депозитные токены с процентами), его нельзя кэшировать
+    """
+    symbol: str
+    contract: ContractTemp
+    decimals: int = 18
+    lp_token: Optional[ContractTemp] = None
+    rebasing: bool = False
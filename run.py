@@ -1,19 +1,124 @@
 import asyncio
 from random import shuffle
 
-from loader import config, semaphore
+from loguru import logger
+
+from loader import config, accounts
 
 from database import initialize_database, close_database
 from core.bot import Bot
-from models import Account
-from database import Accounts
-from utils import setup
+from core.browser_pool import BrowserPool
+from core.deadlines import AccountDeadline, register_progress_listener
+from core.proxies import proxy_rotator, interleave_by_proxy
+from core.signer import signer
+from database import Accounts, LeaseManager
+from utils import setup, LoopMonitor, metrics, rpc_stats, notifier, proxy_clients, retry
+
+leases = LeaseManager(ttl=config.lease_ttl)
+browser_pool = BrowserPool(accounts.get, config.warm_pool_size)
+
+
+async def process_account(profile_number: int) -> None:
+    """
+    Создает аккаунт и бота только в момент начала работы по профилю
+    :param profile_number: номер профиля
+    :return: None
+    """
+    with logger.contextualize(profile_number=profile_number):
+        if not leases.is_held(profile_number):
+            logger.warning(f"{profile_number}: захват аккаунта истек в очереди, пропускаем")
+            await browser_pool.discard(profile_number)
+            return
+        account = accounts.get(profile_number)
+        # прогрев ждем не дольше срока этапа запуска браузера, зависший прогрев отменяется
+        ads = await browser_pool.take(profile_number, timeout=AccountDeadline.budget('browser'))
+        # модем захватываем до сроков этапов, ожидание занятого модема не должно прерывать аккаунт
+        if config.use_proxy:
+            await proxy_rotator.acquire(profile_number, account.proxy)
+        # работу аккаунта ограничивают сроки этапов, общий срок account_timeout входит в них
+        async with Bot(account, ads) as bot:
+            await bot.run()
+
+
+async def worker(queue: asyncio.Queue) -> None:
+    """
+    Долгоживущий воркер, берет номера профилей из очереди, пока не получит None
+    :param queue: очередь номеров профилей
+    :return: None
+    """
+    while (profile_number := await queue.get()) is not None:
+        try:
+            await process_account(profile_number)
+        except Exception as error:
+            logger.debug(f"{profile_number}: аккаунт завершен с ошибкой {error}")
+        finally:
+            proxy_rotator.release(profile_number)
+            await leases.release(profile_number)
+            queue.task_done()
+    queue.task_done()
+
+
+async def seed_accounts(profile_numbers: list[int]) -> None:
+    """
+    Создает в бд записи для профилей, которых там еще нет, чтобы их можно было захватывать
+    :param profile_numbers: номера профилей
+    :return: None
+    """
+    existing = await Accounts.get_profile_numbers()
+    missing = [profile_number for profile_number in profile_numbers if profile_number not in existing]
+    if missing:
+        await Accounts.seed(missing)
 
 
-async def worker(account: Account):
-    async with semaphore:
-        async with Bot(account) as bot:
-            await asyncio.wait_for(bot.run(), timeout=900)
+async def claim_and_put(queue: asyncio.Queue, profile_numbers: list[int]) -> None:
+    """
+    Захватывает профили в бд пачками по числу потоков и кладет в очередь,
+    профили, занятые другим процессом или уже выполненные, пропускаются
+    :param queue: очередь номеров профилей
+    :param profile_numbers: номера профилей
+    :return: None
+    """
+    for start in range(0, len(profile_numbers), config.threads):
+        batch = profile_numbers[start:start + config.threads]
+        claimed = await leases.claim_batch(batch)
+        if len(claimed) < len(batch):
+            logger.debug(f"Пропущено аккаунтов, выполненных или занятых другим процессом: {len(batch) - len(claimed)}")
+        for profile_number in claimed:
+            browser_pool.schedule(profile_number)
+            await queue.put(profile_number)
+
+
+async def producer(queue: asyncio.Queue, profile_numbers: list[int], complete_accounts: set[int]) -> None:
+    """
+    Захватывает профили в бд и кладет в ограниченную очередь по мере освобождения воркеров.
+    Если включен watch_new_accounts, продолжает следить за источником и добавляет новые профили
+    :param queue: очередь номеров профилей
+    :param profile_numbers: профили для работы
+    :param complete_accounts: уже завершенные профили
+    :return: None
+    """
+    seen = set(profile_numbers) | complete_accounts
+    try:
+        await claim_and_put(queue, profile_numbers)
+
+        while config.watch_new_accounts:
+            await asyncio.sleep(config.watch_interval)
+            accounts.refresh()
+            new_profiles = [profile_number for profile_number in accounts.profile_numbers()
+                            if profile_number not in seen]
+            if new_profiles:
+                logger.info(f"Добавлены новые аккаунты: {len(new_profiles)}")
+                await seed_accounts(new_profiles)
+            seen.update(new_profiles)
+            if config.use_proxy and config.is_mobile_proxy:
+                new_profiles = interleave_by_proxy(new_profiles, accounts.proxy)
+            await claim_and_put(queue, new_profiles)
+    except (Exception, SystemExit) as error:
+        logger.error(f"Ошибка при получении новых аккаунтов, новые профили больше не добавляются: {error}")
+    finally:
+        # воркеры завершаются только по None, без него запуск зависнет на queue.get
+        for _ in range(config.threads):
+            await queue.put(None)
 
 
 async def main():
@@ -24,22 +129,55 @@ async def main():
     print('Donate: 0xAC8ce8fbC80115a22a9a69e42F50713AAe9ef2F7')
 
     await initialize_database()
+    retry.configure(config.circuit_threshold, config.circuit_cooldown)
+    register_progress_listener()
+
+    loop_monitor = None
+    if config.loop_monitor:
+        loop_monitor = LoopMonitor(threshold=config.loop_lag_threshold)
+        loop_monitor.start()
 
-    complete_accounts = await Accounts.get_complete_accounts()
-    accounts_for_work = [account for account in config.accounts if
-                         account.profile_number not in complete_accounts]
+    if config.metrics_port:
+        await metrics.start_server(config.metrics_port)
 
-    print(f'Всего аккаунтов: {len(config.accounts)}')
+    notifier.start(config.tg_token, config.tg_chat_id, config.tg_digest_interval)
+
+    complete_accounts = set(await Accounts.get_complete_accounts())
+    profile_numbers = accounts.profile_numbers()
+    accounts_for_work = [profile_number for profile_number in profile_numbers if
+                         profile_number not in complete_accounts]
+
+    print(f'Всего аккаунтов: {len(profile_numbers)}')
     print(f'Завершенные аккаунты: {len(complete_accounts)}')
 
     if config.shuffle_profiles:
         shuffle(accounts_for_work)
+    if config.use_proxy and config.is_mobile_proxy:
+        accounts_for_work = interleave_by_proxy(accounts_for_work, accounts.proxy)
+
+    await seed_accounts(accounts_for_work)
+    leases.start()
+
+    queue = asyncio.Queue(maxsize=config.threads)
+    workers = [asyncio.create_task(worker(queue)) for _ in range(config.threads)]
+    await asyncio.gather(producer(queue, accounts_for_work, complete_accounts), *workers, return_exceptions=True)
 
-    tasks = [worker(account) for account in accounts_for_work]
-    await asyncio.gather(*tasks, return_exceptions=True)
+    await browser_pool.stop()
+    await leases.stop()
+    await notifier.stop()
+    if loop_monitor:
+        await loop_monitor.stop()
+        loop_monitor.log_summary()
+    metrics.log_summary()
+    rpc_stats.log_summary()
+    proxy_clients.log_summary()
+    await proxy_clients.close()
+    signer.shutdown()
+    await metrics.stop_server()
     await close_database()
+    await logger.complete()
 
 
 if __name__ == '__main__':
-    setup()
+    setup(config.log_debug_sample_rate)
     asyncio.run(main())
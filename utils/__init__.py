@@ -1,2 +1,10 @@
-from .utils import read_file, load_config, random_amount, random_sleep, get_eth_price, get_request, create_w3
-from .console import setup
\ No newline at end of file
+from .utils import read_file, load_config, random_amount, random_sleep, get_eth_price, get_request, create_w3, get_proxy_w3, rpc_dependency
+from .console import setup
+from .loop_monitor import LoopMonitor
+from .metrics import metrics
+from .rpc import rpc_stats
+from .accounts import AccountSource, create_account_source
+from .notifier import notifier
+from .proxy_pool import proxy_clients
+
+from .retry import retry, classify, RetryPolicy, RetryableError, RPC_POLICY, BROWSER_POLICY, API_POLICY, VERIFY_POLICY
@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import argparse
+import getpass
+import json
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+from array import array
+from typing import Iterable, Iterator, Optional
+
+from better_proxy import Proxy
+from Crypto.Cipher import AES
+from Crypto.Protocol.KDF import scrypt
+from Crypto.Random import get_random_bytes
+from loguru import logger
+
+from models import Account
+
+CONFIG_DATA_PATH = os.path.join(os.getcwd(), 'config', 'data')
+DEFAULT_PROXY = '1.1.1.1:1111'
+DEFAULT_WITHDRAW_ADDRESS = '0x'
+STORE_PASSWORD_ENV = 'ACCOUNTS_STORE_PASSWORD'
+
+
+class AccountSource(ABC):
+    """
+    Источник аккаунтов: номера профилей доступны сразу, а объект Account
+    создается и валидируется только при обращении к конкретному профилю
+    """
+
+    @abstractmethod
+    def profile_numbers(self) -> list[int]:
+        """
+        Возвращает номера профилей в порядке источника
+        :return: список номеров профилей
+        """
+
+    @abstractmethod
+    def get(self, profile_number: int) -> Account:
+        """
+        Возвращает аккаунт по номеру профиля
+        :param profile_number: номер профиля
+        :return: аккаунт
+        """
+
+    def proxy(self, profile_number: int) -> Proxy:
+        """
+        Возвращает только прокси профиля, без создания и валидации всего аккаунта
+        :param profile_number: номер профиля
+        :return: прокси
+        """
+        return self.get(profile_number).proxy
+
+    def refresh(self) -> None:
+        """
+        Перечитывает источник, чтобы увидеть добавленные профили
+        :return: None
+        """
+
+    def iter_accounts(self, exclude: Iterable[int] = ()) -> Iterator[Account]:
+        """
+        Лениво перебирает аккаунты, пропуская переданные номера профилей
+        :param exclude: номера профилей, которые нужно пропустить
+        :return: генератор аккаунтов
+        """
+        exclude = set(exclude)
+        for profile_number in self.profile_numbers():
+            if profile_number not in exclude:
+                yield self.get(profile_number)
+
+    def __len__(self) -> int:
+        return len(self.profile_numbers())
+
+
+class FileAccountSource(AccountSource):
+    """
+    Аккаунты из текстовых файлов config/data, строка N каждого файла относится к одному профилю.
+    При первом обращении строится индекс: номер профиля - смещения строк в файлах
+    """
+    file_names = ('profiles.txt', 'private_keys.txt', 'passwords.txt', 'proxies.txt', 'withdraw_addresses.txt')
+
+    def __init__(self, data_path: str = CONFIG_DATA_PATH) -> None:
+        self.data_path = data_path
+        self._profile_numbers: Optional[list[int]] = None
+        self._index: dict[int, int] = {}
+        self._offsets: dict[str, array] = {}
+        self._placeholders: dict[str, bool] = {}
+
+    def _path(self, file_name: str) -> str:
+        return os.path.join(self.data_path, file_name)
+
+    def _build_index(self) -> None:
+        """
+        Читает файлы один раз, запоминая только номера профилей и смещения строк
+        :return: None
+        """
+        for file_name in self.file_names:
+            path = self._path(file_name)
+            if not os.path.exists(path):
+                logger.error(f"Файл не найден: {path}")
+                exit(1)
+            offsets = array('q')
+            with open(path, 'rb') as file:
+                position = 0
+                for line in file:
+                    if line.strip():
+                        offsets.append(position)
+                    position += len(line)
+            self._offsets[file_name] = offsets
+
+        profiles = [int(line) for line in self._read_lines('profiles.txt')]
+        if not profiles:
+            logger.error(f"Файл пустой: {self._path('profiles.txt')}")
+            exit(1)
+
+        for file_name in ('private_keys.txt', 'passwords.txt'):
+            if len(self._offsets[file_name]) != len(profiles):
+                raise ValueError(
+                    "Количество аккаунтов, прокси, приватных ключей, паролей и адресов вывода должно быть одинаковым")
+        for file_name in ('proxies.txt', 'withdraw_addresses.txt'):
+            self._placeholders[file_name] = self._is_placeholder(file_name)
+            if not self._placeholders[file_name] and len(self._offsets[file_name]) != len(profiles):
+                raise ValueError(
+                    "Количество аккаунтов, прокси, приватных ключей, паролей и адресов вывода должно быть одинаковым")
+
+        self._profile_numbers = profiles
+        self._index = {profile_number: line for line, profile_number in enumerate(profiles)}
+
+    def _read_lines(self, file_name: str) -> Iterator[str]:
+        with open(self._path(file_name), 'r', encoding='utf-8') as file:
+            for line in file:
+                if line := line.strip():
+                    yield line
+
+    def _read_line(self, file_name: str, line_number: int) -> str:
+        with open(self._path(file_name), 'rb') as file:
+            file.seek(self._offsets[file_name][line_number])
+            return file.readline().decode('utf-8').strip()
+
+    def _is_placeholder(self, file_name: str) -> bool:
+        """
+        Проверяет что необязательный файл пустой или содержит текст-заглушку из примера
+        :param file_name: имя файла
+        :return: True если файл не заполнен
+        """
+        offsets = self._offsets[file_name]
+        if not offsets:
+            return True
+        first_line = self._read_line(file_name, 0)
+        return 'заполнить' in first_line or 'вставьте' in first_line
+
+    def profile_numbers(self) -> list[int]:
+        if self._profile_numbers is None:
+            self._build_index()
+        return self._profile_numbers
+
+    def refresh(self) -> None:
+        self._profile_numbers = None
+
+    def proxy(self, profile_number: int) -> Proxy:
+        if self._profile_numbers is None:
+            self._build_index()
+        if self._placeholders['proxies.txt']:
+            return Proxy.from_str(DEFAULT_PROXY)
+        return Proxy.from_str(self._read_line('proxies.txt', self._index[profile_number]))
+
+    def get(self, profile_number: int) -> Account:
+        if self._profile_numbers is None:
+            self._build_index()
+        line = self._index[profile_number]
+
+        withdraw_address = DEFAULT_WITHDRAW_ADDRESS
+        if not self._placeholders['withdraw_addresses.txt']:
+            withdraw_address = self._read_line('withdraw_addresses.txt', line)
+
+        return Account(
+            profile_number=profile_number,
+            private_key=self._read_line('private_keys.txt', line),
+            password=self._read_line('passwords.txt', line),
+            proxy=self.proxy(profile_number),
+            withdraw_address=withdraw_address,
+        )
+
+
+class EncryptedAccountStore(AccountSource):
+    """
+    Аккаунты в одном файле SQLite, данные каждого аккаунта зашифрованы AES-GCM,
+    ключ получается из пароля через scrypt. Номера профилей хранятся открыто,
+    поэтому список профилей доступен без расшифровки
+    """
+
+    def __init__(self, path: str, password: Optional[str] = None) -> None:
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value BLOB)')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS accounts (profile_number INTEGER PRIMARY KEY, position INTEGER, data BLOB)')
+        self.connection.commit()
+
+        salt = self._get_salt()
+        password = password or os.environ.get(STORE_PASSWORD_ENV) or getpass.getpass('Пароль хранилища аккаунтов: ')
+        self._key = scrypt(password.encode(), salt, key_len=32, N=2 ** 15, r=8, p=1)
+
+    def _get_salt(self) -> bytes:
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'salt'").fetchone()
+        if row:
+            return row[0]
+        salt = get_random_bytes(16)
+        self.connection.execute("INSERT INTO meta (key, value) VALUES ('salt', ?)", (salt,))
+        self.connection.commit()
+        return salt
+
+    def _encrypt(self, data: dict) -> bytes:
+        cipher = AES.new(self._key, AES.MODE_GCM)
+        ciphertext, tag = cipher.encrypt_and_digest(json.dumps(data).encode())
+        return cipher.nonce + tag + ciphertext
+
+    def _decrypt(self, blob: bytes) -> dict:
+        nonce, tag, ciphertext = blob[:16], blob[16:32], blob[32:]
+        cipher = AES.new(self._key, AES.MODE_GCM, nonce=nonce)
+        try:
+            return json.loads(cipher.decrypt_and_verify(ciphertext, tag))
+        except ValueError:
+            raise ValueError("Неверный пароль хранилища аккаунтов или файл поврежден")
+
+    def profile_numbers(self) -> list[int]:
+        rows = self.connection.execute('SELECT profile_number FROM accounts ORDER BY position')
+        return [row[0] for row in rows]
+
+    def _load(self, profile_number: int) -> dict:
+        row = self.connection.execute(
+            'SELECT data FROM accounts WHERE profile_number = ?', (profile_number,)).fetchone()
+        if row is None:
+            raise KeyError(f"Профиль {profile_number} не найден в хранилище аккаунтов")
+        return self._decrypt(row[0])
+
+    def proxy(self, profile_number: int) -> Proxy:
+        return Proxy.from_str(self._load(profile_number)['proxy'])
+
+    def get(self, profile_number: int) -> Account:
+        data = self._load(profile_number)
+        return Account(profile_number=profile_number, proxy=Proxy.from_str(data.pop('proxy')), **data)
+
+    def import_accounts(self, source: AccountSource) -> int:
+        """
+        Записывает аккаунты из другого источника в хранилище, существующие профили перезаписываются
+        :param source: источник аккаунтов
+        :return: количество записанных аккаунтов
+        """
+        count = 0
+        with self.connection:
+            for position, account in enumerate(source.iter_accounts()):
+                data = {
+                    'private_key': account.private_key,
+                    'password': account.password,
+                    'proxy': account.proxy.as_url,
+                    'withdraw_address': account.withdraw_address,
+                }
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO accounts (profile_number, position, data) VALUES (?, ?, ?)',
+                    (account.profile_number, position, self._encrypt(data)))
+                count += 1
+        return count
+
+
+def create_account_source(store_path: str = '') -> AccountSource:
+    """
+    Создает источник аккаунтов: зашифрованное хранилище, если указан путь, иначе текстовые файлы
+    :param store_path: путь к файлу хранилища
+    :return: источник аккаунтов
+    """
+    if store_path:
+        return EncryptedAccountStore(store_path)
+    return FileAccountSource()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Импорт аккаунтов из текстовых файлов в зашифрованное хранилище')
+    parser.add_argument('store_path', help='путь к файлу хранилища, например config/data/accounts.db')
+    args = parser.parse_args()
+
+    store = EncryptedAccountStore(args.store_path)
+    imported = store.import_accounts(FileAccountSource())
+    print(f'Импортировано аккаунтов: {imported}')
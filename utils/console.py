@@ -4,20 +4,53 @@ import urllib3
 from loguru import logger
 
 
-def setup():
+class DebugSampler:
     """
-    Настройка логгера
+    Фильтр файлового лога: из частых debug событий, помеченных bind(sampled=True),
+    пропускает только каждое N-е для каждой строки кода
+    """
+
+    def __init__(self, rate: int) -> None:
+        self.rate = max(rate, 1)
+        self.counters: dict[tuple[str, int], int] = {}
+
+    def __call__(self, record: dict) -> bool:
+        if record['level'].name != 'DEBUG' or not record['extra'].get('sampled'):
+            return True
+        key = (record['name'], record['line'])
+        count = self.counters.get(key, 0)
+        self.counters[key] = count + 1
+        return count % self.rate == 0
+
+
+def setup(debug_sample_rate: int = 10):
+    """
+    Настройка логгера.
+    Запись в консоль и файл идет в фоновом потоке (enqueue), файл пишется в JSON с контекстом аккаунта,
+    ротация и сжатие тоже выполняются в фоновом потоке
+    :param debug_sample_rate: из скольких частых debug событий записывать одно
     :return:
     """
 
     urllib3.disable_warnings()
 
     logger.remove()
+    logger.configure(extra={'profile_number': None})
     logger.add(
         sys.stdout,
         colorize=True,
         format="<light-cyan>{time:DD-MM HH:mm:ss}</light-cyan> | <level> {level: <8} </level> {file}:{function}:{line} | {message}",
         level="INFO",
+        enqueue=True,
     )
 
-    logger.add("logs/logs.log", rotation="1 day", retention="7 days", level="DEBUG")
+    logger.add(
+        "logs/logs.log",
+        rotation="1 day",
+        retention="7 days",
+        compression="zip",
+        level="DEBUG",
+        serialize=True,
+        enqueue=True,
+        filter=DebugSampler(debug_sample_rate),
+    )
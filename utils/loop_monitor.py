@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from loguru import logger
+
+PROJECT_PATH = os.getcwd()
+
+
+class LoopMonitor:
+    """
+    Мониторинг задержек событийного цикла.
+    Корутина-тикер замеряет опоздание пробуждения цикла, а фоновый поток во время зависания
+    снимает стек потока цикла, чтобы показать какая функция его заблокировала
+    """
+
+    def __init__(self, threshold: float = 0.1, interval: float = 0.05) -> None:
+        self.threshold = threshold
+        self.interval = interval
+        self.max_lag = 0.0
+        self.ticks = 0
+        self.blocked: dict[str, list[float]] = {}
+        self._last_tick = time.monotonic()
+        self._stall_stack: Optional[traceback.StackSummary] = None
+        self._loop_thread_id: Optional[int] = None
+        self._running = False
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """
+        Запускает тикер в текущем цикле и поток-наблюдатель
+        :return: None
+        """
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._running = True
+        self._task = asyncio.create_task(self._ticker())
+        self._thread = threading.Thread(target=self._watchdog, name='loop-monitor', daemon=True)
+        self._thread.start()
+        logger.info(f"Мониторинг событийного цикла включен, порог {self.threshold} с")
+
+    async def stop(self) -> None:
+        """
+        Останавливает тикер и поток-наблюдатель
+        :return: None
+        """
+        self._running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._thread:
+            self._thread.join(timeout=1)
+
+    async def _ticker(self) -> None:
+        """
+        Засыпает на interval и считает на сколько позже цикл разбудил корутину
+        :return: None
+        """
+        loop = asyncio.get_running_loop()
+        while self._running:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = loop.time() - started - self.interval
+            self._last_tick = time.monotonic()
+            self.ticks += 1
+            self.max_lag = max(self.max_lag, lag)
+
+            stack, self._stall_stack = self._stall_stack, None
+            if lag >= self.threshold:
+                self._report(lag, stack)
+
+    def _watchdog(self) -> None:
+        """
+        Поток, который снимает стек потока цикла, пока цикл не отвечает дольше порога
+        :return: None
+        """
+        while self._running:
+            time.sleep(self.interval / 2)
+            if time.monotonic() - self._last_tick - self.interval < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                self._stall_stack = traceback.extract_stack(frame)
+
+    def _report(self, lag: float, stack: Optional[traceback.StackSummary]) -> None:
+        """
+        Логирует зависание цикла со стеком и добавляет его в сводку
+        :param lag: задержка цикла в секундах
+        :param stack: стек потока цикла во время зависания
+        :return: None
+        """
+        if not stack:
+            culprit = 'неизвестно'
+            stack_text = ''
+        else:
+            culprit = self._get_culprit(stack)
+            stack_text = ''.join(stack.format()[-10:])
+        self.blocked.setdefault(culprit, []).append(lag)
+        logger.warning(f"Событийный цикл заблокирован на {lag:.3f} с: {culprit}\n{stack_text}")
+
+    @staticmethod
+    def _get_culprit(stack: traceback.StackSummary) -> str:
+        """
+        Находит самый глубокий кадр стека из кода проекта, а если его нет, то самый глубокий кадр
+        :param stack: стек потока цикла
+        :return: строка файл:строка функция
+        """
+        for frame in reversed(stack):
+            if frame.filename.startswith(PROJECT_PATH) and 'site-packages' not in frame.filename \
+                    and not frame.filename.endswith('loop_monitor.py'):
+                return f"{os.path.relpath(frame.filename, PROJECT_PATH)}:{frame.lineno} {frame.name}"
+        frame = stack[-1]
+        return f"{frame.filename}:{frame.lineno} {frame.name}"
+
+    def log_summary(self) -> None:
+        """
+        Выводит сводку за запуск: какие функции блокировали цикл и сколько времени
+        :return: None
+        """
+        logger.info(f"Событийный цикл: максимальная задержка {self.max_lag:.3f} с, тиков {self.ticks}")
+        for culprit, lags in sorted(self.blocked.items(), key=lambda item: sum(item[1]), reverse=True):
+            logger.info(f"Блокировка цикла: {culprit} - {len(lags)} раз, всего {sum(lags):.3f} с, "
+                        f"максимум {max(lags):.3f} с")
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from loguru import logger
+
+BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600, 900)
+METRIC_NAME = 'linea_stage_duration_seconds'
+
+
+class Histogram:
+    """
+    Гистограмма длительностей этапа в формате Prometheus
+    """
+
+    def __init__(self) -> None:
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """
+        Добавляет замер в гистограмму
+        :param value: длительность в секундах
+        :return: None
+        """
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.buckets[index] += 1
+
+
+class Metrics:
+    """
+    Сбор длительностей этапов работы бота по аккаунтам.
+    Отдает гистограммы по http в формате Prometheus и печатает сводку в конце запуска
+    """
+
+    def __init__(self) -> None:
+        self.histograms: dict[tuple[str, int, str], Histogram] = {}
+        self.samples: dict[str, list[float]] = {}
+        self.ok_samples: dict[str, list[float]] = {}
+        # подписчики на каждый замер: stage, profile_number, seconds, status
+        self.listeners: list[Callable[[str, int, float, str], None]] = []
+        self._server: Optional[asyncio.Server] = None
+
+    def observe(self, stage: str, profile_number: int, seconds: float, status: str = 'ok') -> None:
+        """
+        Записывает длительность этапа
+        :param stage: название этапа
+        :param profile_number: номер профиля
+        :param seconds: длительность в секундах
+        :param status: ok если этап завершился без ошибки, иначе error
+        :return: None
+        """
+        key = (stage, profile_number, status)
+        if key not in self.histograms:
+            self.histograms[key] = Histogram()
+        self.histograms[key].observe(seconds)
+        self.samples.setdefault(stage, []).append(seconds)
+        if status == 'ok':
+            self.ok_samples.setdefault(stage, []).append(seconds)
+        for listener in self.listeners:
+            listener(stage, profile_number, seconds, status)
+
+    @contextmanager
+    def span(self, stage: str, profile_number: int) -> Iterator[None]:
+        """
+        Замеряет длительность блока кода, работает и вокруг await
+        :param stage: название этапа
+        :param profile_number: номер профиля
+        :return: None
+        """
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            yield
+            status = 'ok'
+        finally:
+            self.observe(stage, profile_number, time.perf_counter() - started, status)
+
+    def percentile(self, stage: str, q: float, ok_only: bool = False) -> Optional[float]:
+        """
+        Считает перцентиль длительности этапа по всем аккаунтам
+        :param stage: название этапа
+        :param q: перцентиль от 0 до 100
+        :param ok_only: только по этапам, завершившимся без ошибки
+        :return: значение перцентиля или None если замеров нет
+        """
+        samples = (self.ok_samples if ok_only else self.samples).get(stage)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(len(ordered) * q / 100))
+        return ordered[index]
+
+    def render(self) -> str:
+        """
+        Формирует текст метрик в формате Prometheus
+        :return: текст метрик
+        """
+        lines = [
+            f'# HELP {METRIC_NAME} Длительность этапов работы бота',
+            f'# TYPE {METRIC_NAME} histogram',
+        ]
+        for (stage, profile_number, status), histogram in self.histograms.items():
+            labels = f'stage="{stage}",profile="{profile_number}",status="{status}"'
+            for bound, count in zip(BUCKETS, histogram.buckets):
+                lines.append(f'{METRIC_NAME}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{METRIC_NAME}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f'{METRIC_NAME}_sum{{{labels}}} {histogram.sum}')
+            lines.append(f'{METRIC_NAME}_count{{{labels}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    async def start_server(self, port: int, host: str = '127.0.0.1') -> None:
+        """
+        Запускает локальный http сервер для Prometheus
+        :param port: порт
+        :param host: адрес
+        :return: None
+        """
+        self._server = await asyncio.start_server(self._handle, host, port)
+        logger.info(f"Метрики Prometheus доступны на http://{host}:{port}/metrics")
+
+    async def stop_server(self) -> None:
+        """
+        Останавливает http сервер метрик
+        :return: None
+        """
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Отвечает на любой http запрос текущими метриками
+        :return: None
+        """
+        try:
+            await reader.readuntil(b'\r\n\r\n')
+            body = self.render().encode()
+            writer.write(
+                b'HTTP/1.1 200 OK\r\n'
+                b'Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+                b'Content-Length: ' + str(len(body)).encode() + b'\r\n'
+                b'Connection: close\r\n\r\n' + body
+            )
+            await writer.drain()
+        except Exception as error:
+            logger.debug(f"Ошибка ответа сервера метрик: {error}")
+        finally:
+            writer.close()
+
+    def log_summary(self) -> None:
+        """
+        Выводит сводку по этапам за запуск
+        :return: None
+        """
+        for stage, samples in sorted(self.samples.items(), key=lambda item: sum(item[1]), reverse=True):
+            logger.info(
+                f"Этап {stage}: {len(samples)} раз, всего {sum(samples):.1f} с, "
+                f"среднее {sum(samples) / len(samples):.2f} с, p50 {self.percentile(stage, 50):.2f} с, "
+                f"p95 {self.percentile(stage, 95):.2f} с, максимум {max(samples):.2f} с"
+            )
+
+
+metrics = Metrics()
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Literal, Optional
+
+from aiohttp import ClientSession, ClientTimeout
+from loguru import logger
+
+Event = Literal['started', 'completed', 'failed', 'timeout']
+
+EVENT_TITLES = {
+    'started': 'Запущено',
+    'completed': 'Завершено',
+    'failed': 'С ошибкой',
+    'timeout': 'По таймауту',
+}
+MESSAGE_LIMIT = 4096
+# telegram допускает около 20 сообщений в минуту в группу, держим паузу с запасом
+MIN_SEND_INTERVAL = 3.0
+
+
+class TelegramNotifier:
+    """
+    Фоновая отправка уведомлений в телеграм.
+    События копятся в очереди и раз в interval секунд уходят одной сводкой,
+    воркеры только кладут событие в очередь и никогда не ждут отправки
+    """
+
+    def __init__(self) -> None:
+        self.token = ''
+        self.chat_id = ''
+        self.interval = 60
+        self.totals: dict[str, int] = {event: 0 for event in EVENT_TITLES}
+        self._queue: asyncio.Queue[tuple[Event, int, str]] = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self._session: Optional[ClientSession] = None
+        self._last_sent = 0.0
+
+    def start(self, token: str, chat_id: str, interval: int = 60) -> None:
+        """
+        Запускает фоновую задачу отправки сводок, если задан токен бота
+        :param token: токен телеграм бота
+        :param chat_id: id чата
+        :param interval: период отправки сводки в секундах
+        :return: None
+        """
+        if not token:
+            return
+        self.token = token
+        self.chat_id = chat_id
+        self.interval = interval
+        self._session = ClientSession(timeout=ClientTimeout(total=20))
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Останавливает фоновую задачу и отправляет последнюю сводку с итогами запуска
+        :return: None
+        """
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        await self._flush(final=True)
+        await self._session.close()
+
+    def notify(self, event: Event, profile_number: int, error: str = '') -> None:
+        """
+        Добавляет событие в очередь, не блокирует
+        :param event: тип события
+        :param profile_number: номер профиля
+        :param error: текст ошибки
+        :return: None
+        """
+        if self.token:
+            self._queue.put_nowait((event, profile_number, error))
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self._flush()
+
+    async def _flush(self, final: bool = False) -> None:
+        """
+        Забирает накопленные события и отправляет сводку
+        :param final: добавить итоги за весь запуск
+        :return: None
+        """
+        events: dict[str, list[tuple[int, str]]] = {}
+        while not self._queue.empty():
+            event, profile_number, error = self._queue.get_nowait()
+            events.setdefault(event, []).append((profile_number, error))
+            self.totals[event] += 1
+
+        if not events and not final:
+            return
+
+        lines = [f'Сводка за {self.interval} с:' if not final else 'Работа завершена:']
+        for event, title in EVENT_TITLES.items():
+            if event not in events:
+                continue
+            profiles = ', '.join(str(profile_number) for profile_number, _ in events[event])
+            lines.append(f'{title}: {len(events[event])} ({profiles})')
+            if event == 'failed':
+                lines.extend(f'  {profile_number}: {error}' for profile_number, error in events[event])
+        if final:
+            lines.append('Итого: ' + ', '.join(
+                f'{title.lower()} {self.totals[event]}' for event, title in EVENT_TITLES.items()))
+
+        for chunk in self._split('\n'.join(lines)):
+            await self._send(chunk)
+
+    @staticmethod
+    def _split(text: str) -> list[str]:
+        """
+        Делит текст на сообщения не длиннее лимита телеграма по границам строк
+        :param text: текст
+        :return: список сообщений
+        """
+        chunks = []
+        current = ''
+        for line in text.split('\n'):
+            line = line[:MESSAGE_LIMIT]
+            if len(current) + len(line) + 1 > MESSAGE_LIMIT:
+                chunks.append(current)
+                current = ''
+            current = f'{current}\n{line}' if current else line
+        if current:
+            chunks.append(current)
+        return chunks
+
+    async def _send(self, text: str) -> None:
+        """
+        Отправляет сообщение с соблюдением лимитов Bot API, при 429 ждет retry_after
+        :param text: текст сообщения
+        :return: None
+        """
+        url = f"https://api.telegram.org/bot{self.token}/sendMessage"
+        for _ in range(3):
+            wait = self._last_sent + MIN_SEND_INTERVAL - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                async with self._session.post(url, json={"chat_id": self.chat_id, "text": text}) as response:
+                    self._last_sent = time.monotonic()
+                    data = await response.json()
+                if data.get('ok'):
+                    return
+                if data.get('error_code') == 429:
+                    await asyncio.sleep(data.get('parameters', {}).get('retry_after', 5))
+                    continue
+                logger.error(f"Не удалось отправить сообщение в телеграм {data.get('description')}")
+                return
+            except Exception as e:
+                logger.error(f"Не удалось отправить сообщение в телеграм {e}")
+                return
+
+
+notifier = TelegramNotifier()
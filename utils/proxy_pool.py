@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import time
+from typing import Optional
+
+from aiohttp import ClientSession, ClientTimeout
+from loguru import logger
+
+# вес нового замера в скользящих средних задержки и доли ошибок
+EWMA_ALPHA = 0.3
+
+
+class ProxyHealth:
+    """
+    Оценка прокси: скользящие средние задержки успешных запросов и доли ошибок
+    """
+    __slots__ = ('latency', 'failure_rate', 'requests', 'failures')
+
+    def __init__(self) -> None:
+        self.latency: Optional[float] = None
+        self.failure_rate = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def record(self, seconds: float, ok: bool) -> None:
+        """
+        Учитывает результат запроса
+        :param seconds: время запроса
+        :param ok: запрос успешен
+        :return: None
+        """
+        self.requests += 1
+        self.failures += not ok
+        self.failure_rate = EWMA_ALPHA * (not ok) + (1 - EWMA_ALPHA) * self.failure_rate
+        if ok:
+            self.latency = seconds if self.latency is None else EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * self.latency
+
+    def is_healthy(self, max_latency: float, max_failure_rate: float) -> bool:
+        return self.failure_rate <= max_failure_rate and (self.latency is None or self.latency <= max_latency)
+
+
+class ProxyClients:
+    """
+    HTTP клиенты по прокси: на каждый прокси своя aiohttp сессия с пулом соединений,
+    сессии переиспользуются всеми запросами через этот прокси, по каждому прокси ведется оценка здоровья
+    """
+
+    def __init__(self, timeout: int = 20) -> None:
+        self.timeout = timeout
+        self.sessions: dict[Optional[str], ClientSession] = {}
+        self.health: dict[str, ProxyHealth] = {}
+
+    def session(self, proxy: Optional[str] = None) -> ClientSession:
+        """
+        Возвращает сессию прокси, создает ее при первом обращении
+        :param proxy: url прокси или None для прямого подключения
+        :return: сессия
+        """
+        session = self.sessions.get(proxy)
+        if session is None or session.closed:
+            session = self.sessions[proxy] = ClientSession(timeout=ClientTimeout(total=self.timeout))
+        return session
+
+    def record(self, proxy: str, seconds: float, ok: bool) -> None:
+        self.health.setdefault(proxy, ProxyHealth()).record(seconds, ok)
+
+    async def get_json(self, url: str, params: dict = None, proxy: Optional[str] = None) -> dict:
+        """
+        GET запрос через сессию прокси, время и ошибки учитываются в оценке прокси
+        :param url: адрес
+        :param params: параметры
+        :param proxy: url прокси
+        :return: ответ
+        """
+        started = time.perf_counter()
+        try:
+            async with self.session(proxy).get(url, params=params, proxy=proxy) as response:
+                response.raise_for_status()
+                data = await response.json()
+        except Exception:
+            if proxy:
+                self.record(proxy, time.perf_counter() - started, False)
+            raise
+        if proxy:
+            self.record(proxy, time.perf_counter() - started, True)
+        return data
+
+    async def probe(self, proxy: str, url: str, max_latency: float, max_failure_rate: float) -> bool:
+        """
+        Проверяет прокси запросом к url. Не ответивший прокси сразу считается нерабочим,
+        ответивший отсеивается по накопленной оценке задержки и доли ошибок
+        :param proxy: url прокси
+        :param url: адрес для проверки
+        :param max_latency: максимальная допустимая средняя задержка в секундах
+        :param max_failure_rate: максимальная допустимая доля ошибок
+        :return: True если прокси здоров
+        """
+        started = time.perf_counter()
+        try:
+            async with self.session(proxy).get(url, proxy=proxy) as response:
+                response.raise_for_status()
+                await response.read()
+            self.record(proxy, time.perf_counter() - started, True)
+        except Exception as error:
+            logger.debug(f"Прокси {proxy.rsplit('@', 1)[-1]} не ответил на проверку {error}")
+            self.record(proxy, time.perf_counter() - started, False)
+            return False
+        return self.is_healthy(proxy, max_latency, max_failure_rate)
+
+    def is_healthy(self, proxy: str, max_latency: float, max_failure_rate: float) -> bool:
+        health = self.health.get(proxy)
+        return health is None or health.is_healthy(max_latency, max_failure_rate)
+
+    def log_summary(self) -> None:
+        """
+        Выводит оценки прокси, начиная с худших
+        :return: None
+        """
+        for proxy, health in sorted(self.health.items(), key=lambda item: item[1].failure_rate, reverse=True):
+            latency = f'{health.latency * 1000:.0f} мс' if health.latency is not None else '-'
+            logger.info(f"Прокси {proxy.rsplit('@', 1)[-1]}: запросов {health.requests}, ошибок {health.failures}, "
+                        f"задержка {latency}")
+
+    async def close(self) -> None:
+        for session in self.sessions.values():
+            await session.close()
+        self.sessions.clear()
+
+
+proxy_clients = ProxyClients()
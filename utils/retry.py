@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import asyncio
+import re
+import time
+from dataclasses import dataclass
+from random import uniform
+from typing import Awaitable, Callable, Literal, Optional, TypeVar
+
+from aiohttp import ClientError, ClientResponseError
+from loguru import logger
+
+T = TypeVar('T')
+
+ErrorKind = Literal[
+    'rpc_transient', 'rate_limit', 'nonce', 'timeout', 'browser', 'circuit_open',
+    'revert', 'insufficient_funds', 'tx_timeout', 'unknown',
+]
+
+# ошибки, которые не исправятся повтором: повтор только тратит газ и время,
+# а повтор шага после застрявшей транзакции отправит новые транзакции в очередь за ее nonce
+FATAL_KINDS: frozenset[ErrorKind] = frozenset({'revert', 'insufficient_funds', 'tx_timeout'})
+# ошибки, которые говорят о проблеме зависимости, а не аккаунта, их считает предохранитель
+DEPENDENCY_KINDS: frozenset[ErrorKind] = frozenset({'rpc_transient', 'rate_limit', 'timeout', 'browser'})
+
+INSUFFICIENT_FUNDS_MARKERS = ('insufficient funds', 'insufficient balance', 'exceeds balance')
+REVERT_MARKERS = ('execution reverted', 'reverted', 'out of gas')
+NONCE_MARKERS = ('nonce too low', 'nonce too high', 'replacement transaction underpriced', 'already known')
+RATE_LIMIT_MARKERS = ('too many requests', 'rate limit', 'exceeded the quota')
+BROWSER_MARKERS = ('target closed', 'has been closed', 'browser closed', 'disconnected', 'crashed',
+                   'connect_over_cdp', 'econnrefused')
+TRANSIENT_MARKERS = ('timeout', 'timed out', 'connection', 'bad gateway', 'service unavailable',
+                     'gateway timeout', 'header not found', 'temporarily')
+# код HTTP в тексте ошибки, не часть hex адреса, хэша или calldata
+HTTP_STATUS_PATTERN = re.compile(r'(?<![0-9a-fx])(429|502|503|504)(?![0-9a-f])')
+TRANSIENT_STATUSES = {502, 503, 504}
+# сколько ждет вызов, пока пробный запрос разомкнутого предохранителя не завершится
+PROBE_WAIT = 5.0
+
+
+class CircuitOpenError(Exception):
+    """
+    Предохранитель зависимости разомкнут, запрос не отправляется
+    """
+
+    def __init__(self, name: str, remaining: float):
+        super().__init__(f"Зависимость {name} недоступна, повтор через {remaining:.0f} с")
+        self.name = name
+        self.remaining = remaining
+
+
+class RetryableError(Exception):
+    """
+    Ошибка, которую нужно повторить, например квест еще не засчитан на сайте
+    """
+
+
+def classify(error: BaseException) -> ErrorKind:
+    """
+    Определяет тип ошибки по классу и тексту, текст проверяется в порядке от неисправимых к временным
+    :param error: исключение
+    :return: тип ошибки
+    """
+    # исключение может само объявить свой тип
+    if kind := getattr(error, 'error_kind', None):
+        return kind
+    if isinstance(error, CircuitOpenError):
+        return 'circuit_open'
+    if isinstance(error, RetryableError):
+        return 'unknown'
+    message = f'{type(error).__name__} {error}'.lower()
+    status = error.status if isinstance(error, ClientResponseError) else None
+    if status is None and (match := HTTP_STATUS_PATTERN.search(message)):
+        status = int(match.group(1))
+    if status == 429:
+        return 'rate_limit'
+
+    if any(marker in message for marker in INSUFFICIENT_FUNDS_MARKERS):
+        return 'insufficient_funds'
+    if type(error).__name__ == 'ContractLogicError' or any(marker in message for marker in REVERT_MARKERS):
+        return 'revert'
+    if any(marker in message for marker in NONCE_MARKERS):
+        return 'nonce'
+    if any(marker in message for marker in RATE_LIMIT_MARKERS):
+        return 'rate_limit'
+    if any(marker in message for marker in BROWSER_MARKERS):
+        return 'browser'
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)) or type(error).__name__ == 'TimeoutError':
+        return 'timeout'
+    if status in TRANSIENT_STATUSES or isinstance(error, (ClientError, ConnectionError)) or any(
+            marker in message for marker in TRANSIENT_MARKERS):
+        return 'rpc_transient'
+    return 'unknown'
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    Политика повторов: число попыток и экспоненциальная пауза со случайным разбросом,
+    чтобы аккаунты после общего сбоя не повторяли запросы одновременно
+    """
+    attempts: int = 3
+    base_delay: float = 2.0
+    max_delay: float = 30.0
+    multiplier: float = 2.0
+    # при лимите запросов пауза больше, чтобы не продлевать бан
+    rate_limit_factor: float = 3.0
+
+    def delay(self, attempt: int, kind: ErrorKind) -> float:
+        """
+        Пауза перед следующей попыткой
+        :param attempt: номер неудачной попытки с нуля
+        :param kind: тип ошибки
+        :return: пауза в секундах
+        """
+        delay = min(self.max_delay, self.base_delay * self.multiplier ** attempt)
+        if kind == 'rate_limit':
+            delay = min(self.max_delay, delay * self.rate_limit_factor)
+        return uniform(delay / 2, delay)
+
+
+class CircuitBreaker:
+    """
+    Предохранитель зависимости, общий для всех аккаунтов.
+    После threshold подряд ошибок зависимости размыкается на cooldown секунд и аккаунты не тратят попытки впустую,
+    затем пропускает один пробный запрос, остальные ждут его результата: успех замыкает, ошибка снова размыкает.
+    Если результат пробы не пришел за cooldown, пропускается следующая проба
+    """
+
+    def __init__(self, name: str, threshold: int = 5, cooldown: float = 60):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_at: Optional[float] = None
+
+    def remaining(self) -> float:
+        """
+        Сколько секунд предохранитель еще разомкнут
+        :return: секунды, 0 если замкнут или можно отправить пробный запрос
+        """
+        if self.failures < self.threshold:
+            return 0.0
+        return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def check(self) -> None:
+        """
+        Проверяет, можно ли обращаться к зависимости, после паузы пропускает один пробный вызов
+        :return: None
+        """
+        if self.failures < self.threshold:
+            return
+        if remaining := self.remaining():
+            raise CircuitOpenError(self.name, remaining)
+        now = time.monotonic()
+        if self.probe_at is not None and now - self.probe_at < self.cooldown:
+            raise CircuitOpenError(self.name, PROBE_WAIT)
+        self.probe_at = now
+
+    def record_success(self) -> None:
+        if self.failures >= self.threshold:
+            logger.info(f"Зависимость {self.name} снова отвечает")
+        self.failures = 0
+        self.probe_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failures >= self.threshold:
+            if self.failures == self.threshold:
+                logger.warning(f"Зависимость {self.name} недоступна, приостанавливаем запросы на {self.cooldown} с")
+            self.opened_at = time.monotonic()
+            self.probe_at = None
+
+
+class RetryEngine:
+    """
+    Общий механизм повторов с классификацией ошибок и предохранителями по зависимостям
+    """
+
+    def __init__(self) -> None:
+        self.threshold = 5
+        self.cooldown = 60.0
+        self.breakers: dict[str, CircuitBreaker] = {}
+
+    def configure(self, threshold: int, cooldown: float) -> None:
+        """
+        Задает параметры предохранителей из конфига
+        :param threshold: число ошибок подряд до размыкания
+        :param cooldown: время размыкания в секундах
+        :return: None
+        """
+        self.threshold = threshold
+        self.cooldown = cooldown
+
+    def breaker(self, name: str) -> CircuitBreaker:
+        """
+        Предохранитель зависимости, создается при первом обращении
+        :param name: имя зависимости
+        :return: предохранитель
+        """
+        if name not in self.breakers:
+            self.breakers[name] = CircuitBreaker(name, self.threshold, self.cooldown)
+        return self.breakers[name]
+
+    async def run(
+            self,
+            func: Callable[[], Awaitable[T]],
+            policy: RetryPolicy,
+            dependency: Optional[str] = None,
+            description: str = '',
+            charge: bool = True,
+    ) -> T:
+        """
+        Выполняет func с повторами по политике. Неисправимые ошибки (revert, нехватка средств)
+        пробрасываются сразу, остальные повторяются с паузой, после последней попытки пробрасывается последняя ошибка
+        :param func: асинхронная функция без аргументов
+        :param policy: политика повторов
+        :param dependency: имя зависимости для предохранителя, например rpc, ads, intract
+        :param description: описание действия для логов
+        :param charge: учитывать результат func в предохранителе. False, если func обращается не только
+            к зависимости и предохранитель учитывает ее ошибки сам, как RPC в RPCAccountingMiddleware
+        :return: результат func
+        """
+        breaker = self.breaker(dependency) if dependency else None
+        attempt = 0
+        while True:
+            if breaker:
+                try:
+                    breaker.check()
+                except CircuitOpenError as error:
+                    # ожидание разомкнутого предохранителя не тратит попытку, его ограничивает срок этапа
+                    delay = error.remaining + uniform(0, policy.base_delay)
+                    logger.warning(f"{description}: {error}, ждем {delay:.1f} с")
+                    await asyncio.sleep(delay)
+                    continue
+            try:
+                result = await func()
+            except Exception as error:
+                kind = classify(error)
+                if breaker and charge and kind in DEPENDENCY_KINDS:
+                    breaker.record_failure()
+                if kind in FATAL_KINDS or attempt == policy.attempts - 1:
+                    raise
+                delay = policy.delay(attempt, kind)
+                attempt += 1
+                logger.warning(f"{description}: ошибка {kind} {error}, попытка {attempt + 1} "
+                               f"из {policy.attempts} через {delay:.1f} с")
+                await asyncio.sleep(delay)
+            else:
+                if breaker and charge:
+                    breaker.record_success()
+                return result
+
+
+retry = RetryEngine()
+
+RPC_POLICY = RetryPolicy(attempts=3, base_delay=2, max_delay=30)
+BROWSER_POLICY = RetryPolicy(attempts=3, base_delay=3, max_delay=20)
+API_POLICY = RetryPolicy(attempts=3, base_delay=1, max_delay=10)
+VERIFY_POLICY = RetryPolicy(attempts=3, base_delay=10, max_delay=60)
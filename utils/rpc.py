@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Coroutine
+
+from loguru import logger
+from web3.middleware import Web3Middleware
+from web3.types import RPCEndpoint, RPCResponse
+
+from utils.retry import retry
+
+# методы, результат которых не меняется и может кэшироваться на весь запуск
+IMMUTABLE_METHODS = {'eth_chainId', 'net_version'}
+# методы, результат которых неизменен, как только он не пустой
+IMMUTABLE_WHEN_FOUND_METHODS = {'eth_getTransactionReceipt'}
+# сколько результатов держать в кэше, старые вытесняются, чтобы долгий запуск не копил память
+CACHE_SIZE = 2048
+
+
+class RPCStats:
+    """
+    Статистика RPC запросов за запуск: количество, время, ошибки, склеенные и закэшированные запросы
+    """
+
+    def __init__(self) -> None:
+        self.calls: dict[str, int] = {}
+        self.seconds: dict[str, float] = {}
+        self.errors: dict[str, int] = {}
+        self.deduplicated: dict[str, int] = {}
+        self.cached: dict[str, int] = {}
+
+    @staticmethod
+    def increment(counter: dict[str, int | float], method: str, value: int | float = 1) -> None:
+        """
+        Увеличивает счетчик метода
+        :param counter: словарь счетчиков
+        :param method: RPC метод
+        :param value: на сколько увеличить
+        :return: None
+        """
+        counter[method] = counter.get(method, 0) + value
+
+    def log_summary(self) -> None:
+        """
+        Выводит сводку RPC запросов за запуск
+        :return: None
+        """
+        total = sum(self.calls.values())
+        saved = sum(self.deduplicated.values()) + sum(self.cached.values())
+        logger.info(f"RPC запросов отправлено: {total}, сэкономлено: {saved}")
+        for method, calls in sorted(self.calls.items(), key=lambda item: item[1], reverse=True):
+            logger.info(
+                f"RPC {method}: {calls} запросов, среднее {self.seconds[method] / calls * 1000:.0f} мс, "
+                f"ошибок {self.errors.get(method, 0)}, склеено {self.deduplicated.get(method, 0)}, "
+                f"из кэша {self.cached.get(method, 0)}"
+            )
+
+
+rpc_stats = RPCStats()
+
+
+class RequestAbandoned(Exception):
+    """
+    Первый вызывающий склеенного запроса отменен, ожидающие отправляют запрос сами
+    """
+
+
+class RPCAccountingMiddleware(Web3Middleware):
+    """
+    Middleware провайдера: считает и замеряет RPC запросы по методам,
+    склеивает одинаковые одновременные запросы в один и кэширует неизменяемые результаты.
+    Сбои соединения с нодой учитываются в предохранителе RPC этого w3 (rpc_dependency)
+    """
+
+    def __init__(self, w3) -> None:
+        super().__init__(w3)
+        self._in_flight: dict[tuple[str, str], asyncio.Future] = {}
+        self._cache: OrderedDict[tuple[str, str], RPCResponse] = OrderedDict()
+
+    async def async_wrap_make_request(
+            self,
+            make_request: Callable[[RPCEndpoint, Any], Coroutine[Any, Any, RPCResponse]]
+    ) -> Callable[[RPCEndpoint, Any], Coroutine[Any, Any, RPCResponse]]:
+
+        breaker = retry.breaker(getattr(self._w3, 'rpc_dependency', 'rpc'))
+
+        async def middleware(method: RPCEndpoint, params: Any) -> RPCResponse:
+            key = (method, json.dumps(params, sort_keys=True, default=str))
+
+            if key in self._cache:
+                rpc_stats.increment(rpc_stats.cached, method)
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+            while key in self._in_flight:
+                rpc_stats.increment(rpc_stats.deduplicated, method)
+                try:
+                    return await asyncio.shield(self._in_flight[key])
+                except RequestAbandoned:
+                    # запрос отправлял аккаунт, который отменили по его сроку, повторяем запрос от себя
+                    continue
+
+            future = asyncio.get_running_loop().create_future()
+            self._in_flight[key] = future
+            started = time.perf_counter()
+            try:
+                response = await make_request(method, params)
+            except asyncio.CancelledError:
+                # общий future не отменяем, иначе отмена одного аккаунта отменит задачи других
+                future.set_exception(RequestAbandoned())
+                future.exception()
+                raise
+            except Exception as error:
+                rpc_stats.increment(rpc_stats.errors, method)
+                breaker.record_failure()
+                future.set_exception(error)
+                # исключение уже передано ожидающим, если их не было, не даем asyncio ругаться
+                future.exception()
+                raise
+            finally:
+                self._in_flight.pop(key, None)
+                rpc_stats.increment(rpc_stats.calls, method)
+                rpc_stats.increment(rpc_stats.seconds, method, time.perf_counter() - started)
+
+            # нода ответила, даже если ответ с ошибкой, например revert
+            breaker.record_success()
+            if 'error' in response:
+                rpc_stats.increment(rpc_stats.errors, method)
+            elif method in IMMUTABLE_METHODS or (
+                    method in IMMUTABLE_WHEN_FOUND_METHODS and response.get('result') is not None):
+                self._cache[key] = response
+                if len(self._cache) > CACHE_SIZE:
+                    self._cache.popitem(last=False)
+            future.set_result(response)
+            return response
+
+        return middleware
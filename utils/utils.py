@@ -2,21 +2,28 @@ from __future__ import annotations
 
 import asyncio
 import os
+import time
 from random import uniform
+from typing import Optional
+from urllib.parse import urlsplit
 
 import yaml
-from aiohttp import ClientSession, ClientTimeout
-from requests import get
-from better_proxy import Proxy
 from loguru import logger
 from web3 import AsyncWeb3, AsyncHTTPProvider
 from web3.eth import AsyncEth
 
-from models import Account, Config
+from models import Config
+from utils.proxy_pool import proxy_clients
+from utils.rpc import RPCAccountingMiddleware
+from utils.retry import retry, API_POLICY
 
 CONFIG_PATH = os.path.join(os.getcwd(), 'config')
 CONFIG_DATA_PATH = os.path.join(CONFIG_PATH, "data")
 CONFIG_PARAMS = os.path.join(CONFIG_PATH, "settings.yaml")
+ETH_PRICE_TTL = 300
+
+_eth_price: tuple[float, float] = (0.0, 0.0)
+_proxy_w3: dict[tuple[str, str], AsyncWeb3] = {}
 
 
 def read_file(
@@ -55,67 +62,61 @@ def read_file(
     return [line.strip() for line in data]
 
 
-def get_accounts() -> list[Account]:
-    """
-    Достает из файлов данные для создания аккаунтов
-    :return: список аккаунтов
-    """
-    profiles = read_file(os.path.join(CONFIG_DATA_PATH, "profiles.txt"), convert_to_int=True)
-    private_keys = read_file(os.path.join(CONFIG_DATA_PATH, "private_keys.txt"))
-    passwords = read_file(os.path.join(CONFIG_DATA_PATH, "passwords.txt"))
-    proxies = read_file(os.path.join(CONFIG_DATA_PATH, "proxies.txt"), check_empty=False)
-    withdraw_addresses = read_file(os.path.join(CONFIG_DATA_PATH, "withdraw_addresses.txt"),
-                                   check_empty=False)
-    if not proxies or 'заполнить' in proxies:
-        proxies = ['1.1.1.1:1111'] * len(profiles)
-
-    if not withdraw_addresses or 'вставьте' in withdraw_addresses:
-        withdraw_addresses = ['0x'] * len(profiles)
-
-    if len(profiles) != len(private_keys) != len(proxies) != len(passwords) != len(withdraw_addresses):
-        raise ValueError(
-            "Количество аккаунтов, прокси, приватных ключей, паролей и адресов вывода должно быть одинаковым")
-
-    accounts = []
-    for profile_number, private_key, password, proxy_str, withdraw_address in zip(profiles, private_keys,
-                                                                                  passwords, proxies,
-                                                                                  withdraw_addresses):
-        proxy = Proxy.from_str(proxy_str)
-        accounts.append(Account(
-            profile_number=profile_number,
-            private_key=private_key,
-            password=password,
-            proxy=proxy,
-            withdraw_address=withdraw_address,
-        ))
-    return accounts
-
-
 def load_config() -> Config:
     """
-    Загружает конфигурацию из файла settings.yaml, создает список аккаунтов, создает объект w3 и возвращает объект Config
+    Загружает конфигурацию из файла settings.yaml и возвращает объект Config.
+    Аккаунты загружаются отдельно и лениво, см. utils.accounts
     :return: объект Config
     """
     settings = read_file(CONFIG_PARAMS, is_yaml=True)
-    accounts = get_accounts()
-    config = Config(accounts=accounts, **settings)
+    config = Config(**settings)
     return config
 
 
-def create_w3(rpc) -> AsyncWeb3:
+def rpc_dependency(proxy: Optional[str] = None) -> str:
+    """
+    Имя предохранителя RPC: у запросов через прокси свой предохранитель на каждый прокси,
+    чтобы мертвый прокси одного аккаунта не останавливал RPC остальных
+    :param proxy: url прокси
+    :return: имя зависимости
+    """
+    if not proxy:
+        return 'rpc'
+    parts = urlsplit(proxy)
+    return f'rpc:{parts.hostname}:{parts.port}'
+
+
+def create_w3(rpc, proxy: Optional[str] = None) -> AsyncWeb3:
     """
     Создает объект w3 для работы с блокчейном
+    :param rpc: адрес RPC
+    :param proxy: url прокси, через который идут RPC запросы
     :return: объект w3
     """
     w3 = AsyncWeb3(
         provider=AsyncHTTPProvider(
             endpoint_uri=rpc,
+            request_kwargs={'proxy': proxy} if proxy else None,
         ),
         modules={'eth': (AsyncEth,)},
     )
+    w3.rpc_dependency = rpc_dependency(proxy)
+    w3.middleware_onion.add(RPCAccountingMiddleware, 'rpc_accounting')
     return w3
 
 
+def get_proxy_w3(rpc: str, proxy: str) -> AsyncWeb3:
+    """
+    Возвращает объект w3 с RPC запросами через прокси, один на каждый прокси
+    :param rpc: адрес RPC
+    :param proxy: url прокси
+    :return: объект w3
+    """
+    if (rpc, proxy) not in _proxy_w3:
+        _proxy_w3[rpc, proxy] = create_w3(rpc, proxy)
+    return _proxy_w3[rpc, proxy]
+
+
 def random_amount(min_n: float, max_n: float, round_n: int = 4) -> float:
     """
     Генерирует случайное число с плавающей точкой, с возможностью округления
@@ -138,35 +139,39 @@ async def random_sleep(min_n: float, max_n: float):
     await asyncio.sleep(sleep_time)
 
 
-async def get_request(url: str, params: dict = None) -> dict:
+async def get_request(url: str, params: dict = None, proxy: Optional[str] = None) -> dict:
     """
-    GET запрос к API
+    GET запрос к API через общую сессию, своя сессия на каждый прокси
     :param url: адрес
     :param params: параметры
+    :param proxy: url прокси
     :return: ответ
     """
-    timeout = ClientTimeout(total=20)
-    async with ClientSession(timeout=timeout) as session:
-        async with session.get(url, params=params) as response:
-            response.raise_for_status()
-            data = await response.json()
-            return data
+    return await proxy_clients.get_json(url, params, proxy)
 
 
-def get_eth_price() -> float:
+async def get_eth_price(api_url: str, proxy: Optional[str] = None) -> float:
     """
-    Получает цену ETH с API wowmax
+    Получает цену ETH с API wowmax, цена кэшируется на ETH_PRICE_TTL секунд для всех аккаунтов
+    :param api_url: адрес API wowmax
+    :param proxy: url прокси
     :return: цена ETH, либо ~2300, если не удалось получить по API
     """
-    for _ in range(3):
-        try:
-            response = get('https://api-gateway.wowmax.exchange/prices')
-            data = response.json()
-            for token in data:
-                if token['symbol'] == 'ETH':
-                    return token['price']
-            asyncio.sleep(5)
-        except Exception:
-            asyncio.sleep(5)
-    logger.error(f"Не можем получить цену ETH, ставим ~2300")
-    return random_amount(2200, 2400)
+    global _eth_price
+    price, updated_at = _eth_price
+    if price and time.monotonic() - updated_at < ETH_PRICE_TTL:
+        return price
+
+    async def fetch() -> float:
+        for token in await get_request(f'{api_url}/prices', proxy=proxy):
+            if token['symbol'] == 'ETH':
+                return token['price']
+        raise Exception("В ответе wowmax нет цены ETH")
+
+    try:
+        price = await retry.run(fetch, API_POLICY, dependency='wowmax', description='Цена ETH')
+    except Exception as e:
+        logger.error(f"Не можем получить цену ETH, ставим ~2300: {e}")
+        return random_amount(2200, 2400)
+    _eth_price = price, time.monotonic()
+    return price